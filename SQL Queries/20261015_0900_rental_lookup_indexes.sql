@@ -0,0 +1,58 @@
+-- Indexes for rental overlap/availability checks and offer lookups
+-- Created: 2026-10-15 09:00
+-- Safe to run repeatedly (idempotent)
+
+SET NOCOUNT ON;
+SET ANSI_NULLS ON;
+SET QUOTED_IDENTIFIER ON;
+
+-- 1) RentalItems by instance (overlap checks: RentalItems.ToolInstanceID IN (...) joined to Rental)
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.indexes
+    WHERE name = 'IX_RentalItems_ToolInstanceID'
+      AND object_id = OBJECT_ID('dbo.RentalItems')
+)
+BEGIN
+    CREATE INDEX IX_RentalItems_ToolInstanceID ON dbo.RentalItems(ToolInstanceID) INCLUDE (RentalID)
+    WHERE ToolInstanceID IS NOT NULL;
+END
+GO
+
+-- 2) RentalItems by rental (selectinload of Rental.RentalItems)
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.indexes
+    WHERE name = 'IX_RentalItems_RentalID'
+      AND object_id = OBJECT_ID('dbo.RentalItems')
+)
+BEGIN
+    CREATE INDEX IX_RentalItems_RentalID ON dbo.RentalItems(RentalID);
+END
+GO
+
+-- 3) Rental date range (overlap predicate StartDate <= @end AND EndDate >= @start)
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.indexes
+    WHERE name = 'IX_Rental_StartDate_EndDate'
+      AND object_id = OBJECT_ID('dbo.Rental')
+)
+BEGIN
+    CREATE INDEX IX_Rental_StartDate_EndDate ON dbo.Rental(StartDate, EndDate) INCLUDE (Status);
+END
+GO
+
+-- 4) Rental number lookups (/api/offers/{offer_number}).
+-- The column collation is case-insensitive and the API upper-cases the parameter, not the column,
+-- so a plain index is sargable; no computed upper-case column is needed.
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.indexes
+    WHERE name = 'IX_Rental_RentalNumber'
+      AND object_id = OBJECT_ID('dbo.Rental')
+)
+BEGIN
+    CREATE INDEX IX_Rental_RentalNumber ON dbo.Rental(RentalNumber);
+END
+GO
@@ -0,0 +1,20 @@
+-- Index for per-location occupancy counts on the warehouse grid
+-- Created: 2026-10-15 13:00
+-- Safe to run repeatedly (idempotent)
+
+SET NOCOUNT ON;
+SET ANSI_NULLS ON;
+SET QUOTED_IDENTIFIER ON;
+
+-- ToolInstances by warehouse/location (GROUP BY LocationCode with Status counts)
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.indexes
+    WHERE name = 'IX_ToolInstances_WarehouseID_LocationCode'
+      AND object_id = OBJECT_ID('dbo.ToolInstances')
+)
+BEGIN
+    CREATE INDEX IX_ToolInstances_WarehouseID_LocationCode ON dbo.ToolInstances(WarehouseID, LocationCode) INCLUDE (Status)
+    WHERE LocationCode IS NOT NULL;
+END
+GO
@@ -0,0 +1,20 @@
+-- Index for per-tool instance availability lookups
+-- Created: 2026-10-15 14:00
+-- Safe to run repeatedly (idempotent)
+
+SET NOCOUNT ON;
+
+-- ToolInstances by tool and status (ToolID = ? AND Status = 'Available' ORDER BY SerialNumber).
+-- SerialNumber in the key returns rows already sorted; the overlap side is covered by
+-- IX_RentalItems_ToolInstanceID and IX_Rental_StartDate_EndDate.
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.indexes
+    WHERE name = 'IX_ToolInstances_ToolID_Status'
+      AND object_id = OBJECT_ID('dbo.ToolInstances')
+)
+BEGIN
+    CREATE INDEX IX_ToolInstances_ToolID_Status ON dbo.ToolInstances(ToolID, Status, SerialNumber)
+    INCLUDE (RequiresCertification, NextCalibration);
+END
+GO
@@ -2,20 +2,30 @@ import os
 import uuid
 import base64
 import binascii
+import hmac
+import itertools
 import json
 import logging
+import tempfile
 import threading
 import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
 from datetime import date, datetime, timedelta
+from decimal import Decimal
 from pathlib import Path
+from typing import BinaryIO
 
+import anyio
+import orjson
 from fastapi import Depends, FastAPI, File, Header, HTTPException, Query, Request, UploadFile
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel, ConfigDict, ValidationError
-from sqlalchemy import func, or_, select, text
-from sqlalchemy.orm import Session, selectinload
-from starlette.middleware.sessions import SessionMiddleware
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import and_, bindparam, case, func, insert, literal_column, or_, select, text, update
+from sqlalchemy.orm import Session, joinedload, load_only, selectinload
 
 try:
     from dotenv import load_dotenv
@@ -25,6 +35,8 @@ except Exception:
     pass
 
 from db.deps import get_asset_db
+from db.session import SessionLocalAsset
+from middleware.asgi import BodySizeLimitMiddleware, PureCORSMiddleware, PureSessionMiddleware, SelectiveGZipMiddleware
 from models.asset_models import AuditLog, NotificationQueue, Rental, RentalItem, Tool, ToolInstance, Warehouse, WarehouseLocation
 from schemas.equipment import EquipmentUpsert, ToolInstanceUpsert
 from schemas.rentals import (
@@ -32,9 +44,11 @@ from schemas.rentals import (
     ExtensionRequest,
     KioskLendRequest,
     MarkItemsForRentalRequest,
+    MarkRentalItemDto,
     OfferCheckoutRequest,
     ReservationDecisionRequest,
     ReceiveMarkedItemsRequest,
+    ReceiveRentalItemDto,
     ReturnRequest,
 )
 from schemas.warehouse import ToolLocationAssignmentDto
@@ -46,8 +60,16 @@ from services.equipment_service import (
     generate_next_instance_number,
     serialize_instance,
     serialize_tool,
+    serialize_tool_row,
 )
-from services.employee_directory_service import EmployeeDirectoryError, get_directory_status, get_employee_directory, get_employees_list
+from services.employee_directory_service import (
+    EmployeeDirectoryError,
+    get_directory_status,
+    get_employee_directory,
+    get_employees_list,
+    invalidate_employee_directory,
+)
+from services.audit_service import enqueue_audit, start_audit_writer, stop_audit_writer
 from services.atlas_user_service import (
     create_user_record,
     delete_user_record,
@@ -70,8 +92,36 @@ BASE_DIR = Path(__file__).resolve().parent
 STATIC_DIR = BASE_DIR / "static"
 UPLOADS_DIR = STATIC_DIR / "uploads" / "tools"
 RENTAL_UPLOADS_DIR = STATIC_DIR / "uploads" / "rentals"
+UPLOAD_COPY_CHUNK_SIZE = 64 * 1024
+MAX_IMAGE_BYTES = max(int(os.environ.get("ASSET_MANAGEMENT_MAX_IMAGE_BYTES") or str(10 * 1024 * 1024)), 1)
+# Multipart framing and the kiosk JSON fields around the base64 photo (4/3 of the raw size).
+_UPLOAD_BODY_LIMIT = MAX_IMAGE_BYTES + UPLOAD_COPY_CHUNK_SIZE
+_KIOSK_BODY_LIMIT = MAX_IMAGE_BYTES * 4 // 3 + UPLOAD_COPY_CHUNK_SIZE
+
+THREADPOOL_SIZE = int(os.environ.get("ASSET_MANAGEMENT_THREADPOOL_SIZE") or "40")
 
-app = FastAPI()
+
+def _open_upload_target(target: Path) -> BinaryIO:
+    # Only the first write after a fresh deploy or volume swap pays for the mkdir.
+    try:
+        return target.open("wb")
+    except FileNotFoundError:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        return target.open("wb")
+
+
+@asynccontextmanager
+async def _lifespan(_app: FastAPI):
+    # Sync endpoints (all DB work goes through blocking pyodbc) run on anyio's worker threads.
+    anyio.to_thread.current_default_thread_limiter().total_tokens = max(THREADPOOL_SIZE, 1)
+    start_audit_writer(SessionLocalAsset)
+    try:
+        yield
+    finally:
+        stop_audit_writer()
+
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=_lifespan)
 
 def _parse_csv_env(name: str, default: str) -> list[str]:
     raw = os.environ.get(name, default)
@@ -88,16 +138,22 @@ if "*" in _CORS_ALLOW_ORIGINS:
     _CORS_ALLOW_CREDENTIALS = False
 
 app.add_middleware(
-    CORSMiddleware,
+    BodySizeLimitMiddleware,
+    limits={
+        "/api/equipment/upload-image": _UPLOAD_BODY_LIMIT,
+        "/api/kiosk/lend": _KIOSK_BODY_LIMIT,
+    },
+)
+app.add_middleware(
+    PureCORSMiddleware,
     allow_origins=_CORS_ALLOW_ORIGINS,
     allow_credentials=_CORS_ALLOW_CREDENTIALS,
-    allow_methods=["*"],
-    allow_headers=["*"]
 )
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=1024, compresslevel=5)
 _APP_SESSION_SECRET = (os.environ.get("SESSION_SIGNING_SECRET") or "").strip()
 if len(_APP_SESSION_SECRET) >= 32:
     app.add_middleware(
-        SessionMiddleware,
+        PureSessionMiddleware,
         secret_key=_APP_SESSION_SECRET,
         session_cookie="asset_management_session",
         same_site="lax",
@@ -119,8 +175,16 @@ STATE_TRANSITIONS = {
     "Returned": {"Closed"},
     "Closed": set(),
 }
+KNOWN_STATES = frozenset(STATE_ALIASES.values()) | RESERVATION_STATES | TERMINAL_STATES
+# Every stored Status that _normalize_state() maps into BLOCKING_STATES: the states themselves, their aliases,
+# and NULL/blank (which default to Reserved). SQL Server's case-insensitive collation and trailing-blank
+# comparison cover the case and strip() differences, so the column is compared as-is and stays sargable.
+BLOCKING_RAW_STATES = tuple(
+    sorted(set(BLOCKING_STATES) | {alias for alias, state in STATE_ALIASES.items() if state in BLOCKING_STATES} | {""})
+)
 LOCAL_ADMIN_USERNAME = "admin"
 LOCAL_ADMIN_PASSWORD = (os.environ.get("LOCAL_ADMIN_PASSWORD") or "").strip()
+LOCAL_ADMIN_PASSWORD_BYTES = LOCAL_ADMIN_PASSWORD.encode("utf-8")
 LOCAL_ADMIN_EMPLOYEE_ID = 999999
 LOCAL_ADMIN_RIGHTS = {
     "manageUsers": True,
@@ -129,15 +193,26 @@ LOCAL_ADMIN_RIGHTS = {
     "manageEquipment": True,
     "checkout": True,
 }
-AUTH_ATTEMPT_WINDOW_SECONDS = int(os.environ.get("AUTH_ATTEMPT_WINDOW_SECONDS") or "300")
-AUTH_MAX_ATTEMPTS_PER_IP = int(os.environ.get("AUTH_MAX_ATTEMPTS_PER_IP") or "50")
-AUTH_MAX_ATTEMPTS_PER_ACCOUNT = int(os.environ.get("AUTH_MAX_ATTEMPTS_PER_ACCOUNT") or "8")
-AUTH_LOCKOUT_SECONDS = int(os.environ.get("AUTH_LOCKOUT_SECONDS") or "900")
+AUTH_ATTEMPT_WINDOW_SECONDS = max(int(os.environ.get("AUTH_ATTEMPT_WINDOW_SECONDS") or "300"), 1)
+AUTH_MAX_ATTEMPTS_PER_IP = max(int(os.environ.get("AUTH_MAX_ATTEMPTS_PER_IP") or "50"), 1)
+AUTH_MAX_ATTEMPTS_PER_ACCOUNT = max(int(os.environ.get("AUTH_MAX_ATTEMPTS_PER_ACCOUNT") or "8"), 1)
+AUTH_LOCKOUT_SECONDS = max(int(os.environ.get("AUTH_LOCKOUT_SECONDS") or "900"), 1)
 AUTH_LOGGER = logging.getLogger("asset_management.auth")
-_AUTH_GUARD_LOCK = threading.Lock()
-_AUTH_ATTEMPTS_BY_IP: dict[str, list[float]] = {}
-_AUTH_ATTEMPTS_BY_ACCOUNT: dict[str, list[float]] = {}
-_AUTH_LOCKOUT_UNTIL_BY_ACCOUNT: dict[str, float] = {}
+EQUIPMENT_CACHE_TTL_SECONDS = int(os.environ.get("EQUIPMENT_CACHE_TTL_SECONDS") or "60")
+# Outside the source tree so a checkout or deploy neither resets it nor needs a writable package dir.
+ASSET_MANAGEMENT_RUNTIME_DIR = Path(
+    os.environ.get("ASSET_MANAGEMENT_RUNTIME_DIR") or Path(tempfile.gettempdir()) / "asset_management"
+)
+_EQUIPMENT_CACHE_STAMP_PATH = ASSET_MANAGEMENT_RUNTIME_DIR / "equipment_cache.stamp"
+_EQUIPMENT_CACHE_LOCK = threading.Lock()
+_EQUIPMENT_CACHE: dict[str, tuple[float, int, list[dict]]] = {}
+_AUTH_GUARD_SHARDS = 64
+_AUTH_GUARD_LOCKS = [threading.Lock() for _ in range(_AUTH_GUARD_SHARDS)]
+_AUTH_ATTEMPTS_BY_IP: list[dict[str, deque[float]]] = [{} for _ in range(_AUTH_GUARD_SHARDS)]
+_AUTH_ATTEMPTS_BY_ACCOUNT: list[dict[str, deque[float]]] = [{} for _ in range(_AUTH_GUARD_SHARDS)]
+_AUTH_LOCKOUT_UNTIL_BY_ACCOUNT: list[dict[str, float]] = [{} for _ in range(_AUTH_GUARD_SHARDS)]
+_AUTH_GUARD_SWEEP_EVERY = 256
+_AUTH_GUARD_CALLS = itertools.count(1)
 
 
 class AuthLoginRequest(BaseModel):
@@ -161,6 +236,11 @@ def log_audit(db: Session, entity_type: str, entity_id: int, action: str, detail
     )
 
 
+def _enqueue_create_audit(rental: Rental, initial_status: str | None = None) -> None:
+    status = initial_status or rental.Status
+    enqueue_audit("Rental", rental.RentalID, "CreateRental", f"Created with status {status}", user_id=rental.EmployeeID)
+
+
 def _get_client_ip(request: Request) -> str:
     forwarded = request.headers.get("x-forwarded-for")
     if forwarded:
@@ -170,67 +250,117 @@ def _get_client_ip(request: Request) -> str:
     return request.client.host if request.client and request.client.host else "unknown"
 
 
-def _prune_attempts(attempts: list[float], now_ts: float) -> list[float]:
-    cutoff = now_ts - max(AUTH_ATTEMPT_WINDOW_SECONDS, 1)
-    return [ts for ts in attempts if ts >= cutoff]
+def _prune_attempts(attempts: deque[float], now_ts: float) -> None:
+    cutoff = now_ts - AUTH_ATTEMPT_WINDOW_SECONDS
+    while attempts and attempts[0] < cutoff:
+        attempts.popleft()
+
+
+def _guard_shard(key: str) -> int:
+    return hash(key) % _AUTH_GUARD_SHARDS
+
+
+@contextmanager
+def _login_guard_locks(*shards: int):
+    # Always acquire in index order so IP/account pairs can't deadlock each other.
+    ordered = sorted(set(shards))
+    for shard in ordered:
+        _AUTH_GUARD_LOCKS[shard].acquire()
+    try:
+        yield
+    finally:
+        for shard in reversed(ordered):
+            _AUTH_GUARD_LOCKS[shard].release()
+
+
+def _sweep_login_guard_unlocked(shard: int, now_ts: float) -> None:
+    for attempts_by_key in (_AUTH_ATTEMPTS_BY_IP[shard], _AUTH_ATTEMPTS_BY_ACCOUNT[shard]):
+        for key in list(attempts_by_key):
+            attempts = attempts_by_key[key]
+            _prune_attempts(attempts, now_ts)
+            if not attempts:
+                del attempts_by_key[key]
+    lockouts = _AUTH_LOCKOUT_UNTIL_BY_ACCOUNT[shard]
+    for key, lockout_until in list(lockouts.items()):
+        if lockout_until <= now_ts:
+            del lockouts[key]
 
 
 def _check_login_guard(client_ip: str, account_key: str) -> int | None:
     now_ts = time.time()
-    with _AUTH_GUARD_LOCK:
-        lockout_until = _AUTH_LOCKOUT_UNTIL_BY_ACCOUNT.get(account_key)
+    ip_shard = _guard_shard(client_ip)
+    account_shard = _guard_shard(account_key)
+    with _login_guard_locks(ip_shard, account_shard):
+        if next(_AUTH_GUARD_CALLS) % _AUTH_GUARD_SWEEP_EVERY == 0:
+            _sweep_login_guard_unlocked(ip_shard, now_ts)
+            if account_shard != ip_shard:
+                _sweep_login_guard_unlocked(account_shard, now_ts)
+
+        lockouts = _AUTH_LOCKOUT_UNTIL_BY_ACCOUNT[account_shard]
+        lockout_until = lockouts.get(account_key)
         if lockout_until and lockout_until > now_ts:
             return max(1, int(lockout_until - now_ts))
         if lockout_until and lockout_until <= now_ts:
-            _AUTH_LOCKOUT_UNTIL_BY_ACCOUNT.pop(account_key, None)
-
-        ip_attempts = _prune_attempts(_AUTH_ATTEMPTS_BY_IP.get(client_ip, []), now_ts)
-        account_attempts = _prune_attempts(_AUTH_ATTEMPTS_BY_ACCOUNT.get(account_key, []), now_ts)
-        _AUTH_ATTEMPTS_BY_IP[client_ip] = ip_attempts
-        _AUTH_ATTEMPTS_BY_ACCOUNT[account_key] = account_attempts
-
-        if len(ip_attempts) >= max(AUTH_MAX_ATTEMPTS_PER_IP, 1):
-            oldest = ip_attempts[0]
-            retry_after = max(1, int((oldest + AUTH_ATTEMPT_WINDOW_SECONDS) - now_ts))
-            return retry_after
-        if len(account_attempts) >= max(AUTH_MAX_ATTEMPTS_PER_ACCOUNT, 1):
-            _AUTH_LOCKOUT_UNTIL_BY_ACCOUNT[account_key] = now_ts + max(AUTH_LOCKOUT_SECONDS, 1)
-            return max(AUTH_LOCKOUT_SECONDS, 1)
+            lockouts.pop(account_key, None)
+
+        ip_attempts = _AUTH_ATTEMPTS_BY_IP[ip_shard].get(client_ip)
+        if ip_attempts:
+            _prune_attempts(ip_attempts, now_ts)
+            if len(ip_attempts) >= AUTH_MAX_ATTEMPTS_PER_IP:
+                oldest = ip_attempts[0]
+                retry_after = max(1, int((oldest + AUTH_ATTEMPT_WINDOW_SECONDS) - now_ts))
+                return retry_after
+        account_attempts = _AUTH_ATTEMPTS_BY_ACCOUNT[account_shard].get(account_key)
+        if account_attempts:
+            _prune_attempts(account_attempts, now_ts)
+            if len(account_attempts) >= AUTH_MAX_ATTEMPTS_PER_ACCOUNT:
+                lockouts[account_key] = now_ts + AUTH_LOCKOUT_SECONDS
+                return AUTH_LOCKOUT_SECONDS
     return None
 
 
 def _record_login_failure(client_ip: str, account_key: str) -> None:
     now_ts = time.time()
-    with _AUTH_GUARD_LOCK:
-        ip_attempts = _prune_attempts(_AUTH_ATTEMPTS_BY_IP.get(client_ip, []), now_ts)
-        account_attempts = _prune_attempts(_AUTH_ATTEMPTS_BY_ACCOUNT.get(account_key, []), now_ts)
+    ip_shard = _guard_shard(client_ip)
+    account_shard = _guard_shard(account_key)
+    with _login_guard_locks(ip_shard, account_shard):
+        ip_attempts = _AUTH_ATTEMPTS_BY_IP[ip_shard].setdefault(client_ip, deque())
+        account_attempts = _AUTH_ATTEMPTS_BY_ACCOUNT[account_shard].setdefault(account_key, deque())
+        _prune_attempts(ip_attempts, now_ts)
+        _prune_attempts(account_attempts, now_ts)
         ip_attempts.append(now_ts)
         account_attempts.append(now_ts)
-        _AUTH_ATTEMPTS_BY_IP[client_ip] = ip_attempts
-        _AUTH_ATTEMPTS_BY_ACCOUNT[account_key] = account_attempts
-        if len(account_attempts) >= max(AUTH_MAX_ATTEMPTS_PER_ACCOUNT, 1):
-            _AUTH_LOCKOUT_UNTIL_BY_ACCOUNT[account_key] = now_ts + max(AUTH_LOCKOUT_SECONDS, 1)
+        if len(account_attempts) >= AUTH_MAX_ATTEMPTS_PER_ACCOUNT:
+            _AUTH_LOCKOUT_UNTIL_BY_ACCOUNT[account_shard][account_key] = now_ts + AUTH_LOCKOUT_SECONDS
 
 
 def _record_login_success(account_key: str) -> None:
-    with _AUTH_GUARD_LOCK:
-        _AUTH_ATTEMPTS_BY_ACCOUNT.pop(account_key, None)
-        _AUTH_LOCKOUT_UNTIL_BY_ACCOUNT.pop(account_key, None)
+    account_shard = _guard_shard(account_key)
+    with _login_guard_locks(account_shard):
+        _AUTH_ATTEMPTS_BY_ACCOUNT[account_shard].pop(account_key, None)
+        _AUTH_LOCKOUT_UNTIL_BY_ACCOUNT[account_shard].pop(account_key, None)
 
 
-def _audit_auth_event(db: Session, *, action: str, details: str, user_id: int | None = None) -> None:
-    try:
-        log_audit(db, "Auth", int(user_id or 0), action, details, user_id=user_id)
-        db.commit()
-    except Exception:
-        db.rollback()
+def _audit_auth_event(*, action: str, details: str, user_id: int | None = None) -> None:
+    # Auth audit rows are advisory; queue them so login responses don't wait on an INSERT + commit.
+    enqueue_audit("Auth", int(user_id or 0), action, details, user_id=user_id)
 
 
 def _invalid_login_error() -> HTTPException:
     return HTTPException(status_code=401, detail="Invalid credentials.")
 
+
+@app.exception_handler(RequestValidationError)
+async def _handle_request_validation_error(request: Request, exc: RequestValidationError):
+    if request.url.path != "/api/auth/login":
+        return await request_validation_exception_handler(request, exc)
+    # Keep login payload errors as an audited 400 instead of FastAPI's default 422.
+    _audit_auth_event(action="LoginRejected", details=f"ip={_get_client_ip(request)} reason=invalid_payload", user_id=None)
+    return ORJSONResponse({"detail": "Invalid login request."}, status_code=400)
+
+
 @app.get("/healthz")
-def healthcheck():
+async def healthcheck():
     return {"status": "ok"}
 
 
@@ -243,6 +373,30 @@ def healthcheck_api(db: Session = Depends(get_asset_db)):
         raise HTTPException(status_code=503, detail=f"db_unavailable: {exc}") from exc
 
 
+EMPLOYEE_STREAM_BATCH_SIZE = 500
+
+
+def _emit_employees(rows: list[dict[str, str]]):
+    yield b"["
+    for start in range(0, len(rows), EMPLOYEE_STREAM_BATCH_SIZE):
+        chunk = b",".join(
+            orjson.dumps(
+                {
+                    "employeeID": int(row["normalizedNumber"]),
+                    "employeeNumber": row["number"],
+                    "name": row["name"],
+                    "initials": row["initials"],
+                    "displayName": row["displayName"],
+                    "email": row["email"],
+                    "departmentCode": row["departmentCode"],
+                }
+            )
+            for row in rows[start:start + EMPLOYEE_STREAM_BATCH_SIZE]
+        )
+        yield chunk if start == 0 else b"," + chunk
+    yield b"]"
+
+
 @app.get("/api/employees")
 def get_employees(force_refresh: bool = Query(False, alias="forceRefresh")):
     try:
@@ -253,22 +407,13 @@ def get_employees(force_refresh: bool = Query(False, alias="forceRefresh")):
             status_code=503,
             detail=f"Employee directory unavailable: {exc}. cacheCount={status['cacheCount']} cacheExpiresInSeconds={status['cacheExpiresInSeconds']}",
         ) from exc
-    return [
-        {
-            "employeeID": int(row["normalizedNumber"]),
-            "employeeNumber": row["number"],
-            "name": row["name"],
-            "initials": row["initials"],
-            "displayName": row["displayName"],
-            "email": row["email"],
-            "departmentCode": row["departmentCode"],
-        }
-        for row in rows
-    ]
+    # Directory rows are plain strings, so encode them straight with orjson in batches instead of
+    # building the whole array in memory first.
+    return StreamingResponse(_emit_employees(rows), media_type="application/json")
 
 
 @app.get("/api/employees/status")
-def get_employees_status():
+async def get_employees_status():
     return get_directory_status()
 
 
@@ -279,42 +424,23 @@ def search_projects(
     db: Session = Depends(get_asset_db),
 ):
     query = (q or "").strip()
-    stmt = select(Rental.ProjectCode).where(Rental.ProjectCode.is_not(None))
+    code = func.ltrim(func.rtrim(Rental.ProjectCode))
+    stmt = select(func.max(code)).where(Rental.ProjectCode.is_not(None)).where(code != "")
     if query:
         stmt = stmt.where(Rental.ProjectCode.ilike(f"%{query}%"))
-    rows = db.execute(stmt.order_by(Rental.ProjectCode.desc()).limit(limit * 3)).all()
-
-    seen: set[str] = set()
-    output: list[dict[str, str]] = []
-    for row in rows:
-        code = str(row[0] or "").strip()
-        if not code:
-            continue
-        key = code.lower()
-        if key in seen:
-            continue
-        seen.add(key)
-        output.append({"projectCode": code, "display": code})
-        if len(output) >= limit:
-            break
-    return output
+    stmt = stmt.group_by(func.lower(code)).order_by(func.max(code).desc()).limit(limit)
+    return [{"projectCode": row[0], "display": row[0]} for row in db.execute(stmt)]
 
 
 @app.post("/api/auth/login")
-def auth_login(payload: dict, request: Request, db: Session = Depends(get_asset_db)):
+def auth_login(parsed: AuthLoginRequest, request: Request, db: Session = Depends(get_asset_db)):
     client_ip = _get_client_ip(request)
-    try:
-        parsed = AuthLoginRequest.model_validate(payload)
-    except ValidationError:
-        _audit_auth_event(db, action="LoginRejected", details=f"ip={client_ip} reason=invalid_payload", user_id=None)
-        raise HTTPException(status_code=400, detail="Invalid login request.")
-
-    username = str(parsed.username or "").strip().lower()
-    password = str(parsed.password or parsed.pinCode or "")
+    username = (parsed.username or "").strip().lower()
+    password = parsed.password or parsed.pinCode or ""
     raw_employee_id = parsed.employeeID
 
     if not username and raw_employee_id in (None, ""):
-        _audit_auth_event(db, action="LoginRejected", details=f"ip={client_ip} reason=missing_identity", user_id=None)
+        _audit_auth_event(action="LoginRejected", details=f"ip={client_ip} reason=missing_identity", user_id=None)
         raise HTTPException(status_code=400, detail="Invalid login request.")
 
     account_key: str
@@ -325,7 +451,7 @@ def auth_login(payload: dict, request: Request, db: Session = Depends(get_asset_
 
     retry_after = _check_login_guard(client_ip, account_key)
     if retry_after is not None:
-        _audit_auth_event(db, action="LoginThrottled", details=f"ip={client_ip} key={account_key} retry_after={retry_after}", user_id=None)
+        _audit_auth_event(action="LoginThrottled", details=f"ip={client_ip} key={account_key} retry_after={retry_after}", user_id=None)
         AUTH_LOGGER.warning("Login throttled ip=%s key=%s retry_after=%s", client_ip, account_key, retry_after)
         raise HTTPException(
             status_code=429,
@@ -336,12 +462,12 @@ def auth_login(payload: dict, request: Request, db: Session = Depends(get_asset_
     if username:
         if username != LOCAL_ADMIN_USERNAME or not LOCAL_ADMIN_PASSWORD:
             _record_login_failure(client_ip, account_key)
-            _audit_auth_event(db, action="LoginFailed", details=f"ip={client_ip} key={account_key} reason=invalid_admin_identity", user_id=None)
+            _audit_auth_event(action="LoginFailed", details=f"ip={client_ip} key={account_key} reason=invalid_admin_identity", user_id=None)
             AUTH_LOGGER.warning("Login failed ip=%s key=%s reason=invalid_admin_identity", client_ip, account_key)
             raise _invalid_login_error()
-        if password != LOCAL_ADMIN_PASSWORD:
+        if not hmac.compare_digest(password.encode("utf-8"), LOCAL_ADMIN_PASSWORD_BYTES):
             _record_login_failure(client_ip, account_key)
-            _audit_auth_event(db, action="LoginFailed", details=f"ip={client_ip} key={account_key} reason=invalid_admin_password", user_id=None)
+            _audit_auth_event(action="LoginFailed", details=f"ip={client_ip} key={account_key} reason=invalid_admin_password", user_id=None)
             AUTH_LOGGER.warning("Login failed ip=%s key=%s reason=invalid_admin_password", client_ip, account_key)
             raise _invalid_login_error()
 
@@ -357,7 +483,7 @@ def auth_login(payload: dict, request: Request, db: Session = Depends(get_asset_
         token = create_session(session_payload)
         request.session["user"] = dict(session_payload)
         _record_login_success(account_key)
-        _audit_auth_event(db, action="LoginSuccess", details=f"ip={client_ip} key={account_key} method=admin", user_id=LOCAL_ADMIN_EMPLOYEE_ID)
+        _audit_auth_event(action="LoginSuccess", details=f"ip={client_ip} key={account_key} method=admin", user_id=LOCAL_ADMIN_EMPLOYEE_ID)
         AUTH_LOGGER.info("Login success ip=%s key=%s user_id=%s", client_ip, account_key, LOCAL_ADMIN_EMPLOYEE_ID)
         return {"sessionToken": token, "user": session_payload}
 
@@ -366,14 +492,14 @@ def auth_login(payload: dict, request: Request, db: Session = Depends(get_asset_
         employee_id = _resolve_employee_number_or_400(raw_employee_id or 0)
     except HTTPException:
         _record_login_failure(client_ip, account_key)
-        _audit_auth_event(db, action="LoginFailed", details=f"ip={client_ip} key={account_key} reason=invalid_employee_id", user_id=None)
+        _audit_auth_event(action="LoginFailed", details=f"ip={client_ip} key={account_key} reason=invalid_employee_id", user_id=None)
         AUTH_LOGGER.warning("Login failed ip=%s key=%s reason=invalid_employee_id", client_ip, account_key)
         raise HTTPException(status_code=400, detail="Invalid login request.")
 
     account_key = f"employee:{employee_id}"
     retry_after = _check_login_guard(client_ip, account_key)
     if retry_after is not None:
-        _audit_auth_event(db, action="LoginThrottled", details=f"ip={client_ip} key={account_key} retry_after={retry_after}", user_id=employee_id)
+        _audit_auth_event(action="LoginThrottled", details=f"ip={client_ip} key={account_key} retry_after={retry_after}", user_id=employee_id)
         AUTH_LOGGER.warning("Login throttled ip=%s key=%s retry_after=%s", client_ip, account_key, retry_after)
         raise HTTPException(
             status_code=429,
@@ -384,14 +510,14 @@ def auth_login(payload: dict, request: Request, db: Session = Depends(get_asset_
     access = get_user_record(db, employee_id)
     if not access.get("isProvisioned"):
         _record_login_failure(client_ip, account_key)
-        _audit_auth_event(db, action="LoginFailed", details=f"ip={client_ip} key={account_key} reason=employee_not_provisioned", user_id=employee_id)
+        _audit_auth_event(action="LoginFailed", details=f"ip={client_ip} key={account_key} reason=employee_not_provisioned", user_id=employee_id)
         AUTH_LOGGER.warning("Login failed ip=%s key=%s reason=employee_not_provisioned", client_ip, account_key)
         raise _invalid_login_error()
 
-    pin_code = str(parsed.pinCode or parsed.password or "")
+    pin_code = parsed.pinCode or parsed.password or ""
     if not verify_password(db, employee_id, pin_code):
         _record_login_failure(client_ip, account_key)
-        _audit_auth_event(db, action="LoginFailed", details=f"ip={client_ip} key={account_key} reason=invalid_employee_pin", user_id=employee_id)
+        _audit_auth_event(action="LoginFailed", details=f"ip={client_ip} key={account_key} reason=invalid_employee_pin", user_id=employee_id)
         AUTH_LOGGER.warning("Login failed ip=%s key=%s reason=invalid_employee_pin", client_ip, account_key)
         raise _invalid_login_error()
 
@@ -407,7 +533,7 @@ def auth_login(payload: dict, request: Request, db: Session = Depends(get_asset_
     token = create_session(session_payload)
     request.session["user"] = dict(session_payload)
     _record_login_success(account_key)
-    _audit_auth_event(db, action="LoginSuccess", details=f"ip={client_ip} key={account_key} method=employee", user_id=employee_id)
+    _audit_auth_event(action="LoginSuccess", details=f"ip={client_ip} key={account_key} method=employee", user_id=employee_id)
     AUTH_LOGGER.info("Login success ip=%s key=%s user_id=%s", client_ip, account_key, employee_id)
     return {"sessionToken": token, "user": session_payload}
 
@@ -454,6 +580,17 @@ def list_admin_users(
     return list_user_records(db, rows)
 
 
+@app.post("/api/admin/employees/refresh")
+def refresh_employee_directory(
+    request: Request,
+    x_session_token: str | None = Header(None, alias="X-Session-Token"),
+):
+    _require_admin_session_or_403(request, x_session_token)
+    invalidate_employee_directory()
+    _safe_employee_directory()
+    return get_directory_status()
+
+
 @app.post("/api/admin/users")
 def create_admin_user(
     request: Request,
@@ -547,56 +684,101 @@ def delete_admin_user(
     return {"ok": True}
 
 
+def _equipment_cache_stamp() -> int:
+    try:
+        return _EQUIPMENT_CACHE_STAMP_PATH.stat().st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _get_cached_equipment(key: str) -> list[dict] | None:
+    if EQUIPMENT_CACHE_TTL_SECONDS <= 0:
+        return None
+    with _EQUIPMENT_CACHE_LOCK:
+        entry = _EQUIPMENT_CACHE.get(key)
+    if not entry:
+        return None
+    expires_at, stamp, payload = entry
+    if time.time() >= expires_at or stamp != _equipment_cache_stamp():
+        return None
+    return payload
+
+
+def _set_cached_equipment(key: str, payload: list[dict], stamp: int) -> None:
+    if EQUIPMENT_CACHE_TTL_SECONDS <= 0:
+        return
+    with _EQUIPMENT_CACHE_LOCK:
+        _EQUIPMENT_CACHE[key] = (time.time() + EQUIPMENT_CACHE_TTL_SECONDS, stamp, payload)
+
+
+def _invalidate_equipment_cache() -> None:
+    with _EQUIPMENT_CACHE_LOCK:
+        _EQUIPMENT_CACHE.clear()
+    # Touch the shared stamp so the other gunicorn workers drop their copies too.
+    try:
+        _EQUIPMENT_CACHE_STAMP_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _EQUIPMENT_CACHE_STAMP_PATH.touch()
+    except OSError:
+        pass
+
+
 @app.get("/api/equipment")
 def get_equipment(db: Session = Depends(get_asset_db)):
-    tools = db.execute(select(Tool).order_by(Tool.ToolName)).scalars().all()
-    counts = dict(
-        db.execute(
-            select(ToolInstance.ToolID, func.count(ToolInstance.ToolInstanceID))
-            .group_by(ToolInstance.ToolID)
-        ).all()
+    cached = _get_cached_equipment("list")
+    if cached is not None:
+        return cached
+    stamp = _equipment_cache_stamp()
+    instance_stats = (
+        select(
+            ToolInstance.ToolID.label("ToolID"),
+            func.count(ToolInstance.ToolInstanceID).label("InstanceCount"),
+            func.min(case((ToolInstance.RequiresCertification == True, ToolInstance.NextCalibration))).label("InstanceNextCalibrationMin"),
+        )
+        .group_by(ToolInstance.ToolID)
+        .subquery()
     )
-    min_next = dict(
-        db.execute(
-            select(ToolInstance.ToolID, func.min(ToolInstance.NextCalibration))
-            .where(ToolInstance.RequiresCertification == True)
-            .group_by(ToolInstance.ToolID)
-        ).all()
+    stmt = (
+        select(*Tool.__table__.c, instance_stats.c.InstanceCount, instance_stats.c.InstanceNextCalibrationMin)
+        .select_from(Tool.__table__.outerjoin(instance_stats, instance_stats.c.ToolID == Tool.ToolID))
+        .order_by(Tool.ToolName)
     )
     payloads = []
-    for tool in tools:
-        payload = serialize_tool(tool, counts.get(tool.ToolID, 0))
-        payload["instanceNextCalibrationMin"] = min_next.get(tool.ToolID)
+    for row in db.execute(stmt).mappings():
+        payload = serialize_tool_row(row, row["InstanceCount"] or 0)
+        payload["instanceNextCalibrationMin"] = row["InstanceNextCalibrationMin"]
         payloads.append(payload)
+    _set_cached_equipment("list", payloads, stamp)
     return payloads
 
 
 @app.get("/api/equipment/calibration-alerts")
 def get_calibration_alerts(db: Session = Depends(get_asset_db)):
     today = date.today()
+    cache_key = f"calibration-alerts:{today.isoformat()}"
+    cached = _get_cached_equipment(cache_key)
+    if cached is not None:
+        return cached
+    stamp = _equipment_cache_stamp()
     warning_date = today + timedelta(days=30)
 
     stmt = (
-        select(ToolInstance, Tool)
+        select(Tool.ToolID, ToolInstance.ToolInstanceID, Tool.ToolName, ToolInstance.SerialNumber, ToolInstance.NextCalibration)
         .join(Tool, Tool.ToolID == ToolInstance.ToolID)
         .where(ToolInstance.NextCalibration.is_not(None))
         .where(ToolInstance.NextCalibration <= warning_date)
+        .order_by(ToolInstance.NextCalibration.asc())
     )
-    rows = db.execute(stmt).all()
-
-    alerts = []
-    for instance, tool in rows:
-        alerts.append(
-            {
-                "toolID": tool.ToolID,
-                "toolInstanceID": instance.ToolInstanceID,
-                "toolName": tool.ToolName,
-                "serialNumber": instance.SerialNumber,
-                "nextCalibration": instance.NextCalibration,
-            }
-        )
-
-    alerts.sort(key=lambda item: item["nextCalibration"] or date.max)
+    alerts = [
+        {
+            "toolID": tool_id,
+            "toolInstanceID": instance_id,
+            "toolName": tool_name,
+            "serialNumber": serial_number,
+            "nextCalibration": next_calibration,
+        }
+        for tool_id, instance_id, tool_name, serial_number, next_calibration in db.execute(stmt)
+    ]
+    _set_cached_equipment(cache_key, alerts, stamp)
     return alerts
 
 
@@ -620,22 +802,23 @@ def get_equipment_item(tool_id: int, db: Session = Depends(get_asset_db)):
 
 @app.post("/api/equipment")
 def create_equipment(payload: EquipmentUpsert, db: Session = Depends(get_asset_db)):
+    now = datetime.now()
     tool = Tool()
 
-    for field, value in payload.model_dump(exclude_unset=True).items():
-        setattr(tool, _map_tool_field(field), value)
+    for field in payload.model_fields_set:
+        setattr(tool, _TOOL_FIELD_ATTRS[field], getattr(payload, field))
 
     if not tool.SerialNumber:
         tool.SerialNumber = generate_next_registration_number(db)
 
-    tool.UpdatedDate = datetime.now()
-    tool.CreatedDate = datetime.now()
+    tool.UpdatedDate = now
+    tool.CreatedDate = now
     apply_certification_schedule(tool)
 
     db.add(tool)
-    db.commit()
-    db.refresh(tool)
-    instance_number = generate_next_instance_number(db, tool.ToolID)
+    db.flush()
+    # A freshly inserted tool has no instances yet, so its first instance is always #1.
+    instance_number = 1
     instance_serial = build_instance_serial(tool.SerialNumber, instance_number)
     instance = ToolInstance(
         ToolID=tool.ToolID,
@@ -650,30 +833,33 @@ def create_equipment(payload: EquipmentUpsert, db: Session = Depends(get_asset_d
         LastCalibration=tool.LastCalibration,
         NextCalibration=tool.NextCalibration,
         ImagePath=tool.ImagePath,
-        CreatedDate=datetime.now(),
-        UpdatedDate=datetime.now(),
+        CreatedDate=now,
+        UpdatedDate=now,
     )
     apply_instance_certification_schedule(instance)
     db.add(instance)
     db.commit()
+    _invalidate_equipment_cache()
     return serialize_tool(tool, 1)
 
 
 @app.put("/api/equipment/{tool_id}")
 def update_equipment(tool_id: int, payload: EquipmentUpsert, db: Session = Depends(get_asset_db)):
+    now = datetime.now()
     tool = db.get(Tool, tool_id)
     if not tool:
         raise HTTPException(status_code=404, detail="Tool not found")
 
-    for field, value in payload.model_dump(exclude_unset=True).items():
+    for field in payload.model_fields_set:
         if field == "toolID":
             continue
-        setattr(tool, _map_tool_field(field), value)
+        setattr(tool, _TOOL_FIELD_ATTRS[field], getattr(payload, field))
 
-    tool.UpdatedDate = datetime.now()
+    tool.UpdatedDate = now
     apply_certification_schedule(tool)
 
     db.commit()
+    _invalidate_equipment_cache()
     db.refresh(tool)
     count = db.execute(
         select(func.count(ToolInstance.ToolInstanceID)).where(ToolInstance.ToolID == tool_id)
@@ -689,6 +875,7 @@ def delete_equipment(tool_id: int, db: Session = Depends(get_asset_db)):
 
     db.delete(tool)
     db.commit()
+    _invalidate_equipment_cache()
     return {"message": "Deleted"}
 
 
@@ -702,6 +889,7 @@ def get_tool_instances(tool_id: int, db: Session = Depends(get_asset_db)):
 
 @app.post("/api/equipment/{tool_id}/instances")
 def create_tool_instance(tool_id: int, payload: ToolInstanceUpsert, db: Session = Depends(get_asset_db)):
+    now = datetime.now()
     tool = db.get(Tool, tool_id)
     if not tool:
         raise HTTPException(status_code=404, detail="Tool not found")
@@ -722,28 +910,29 @@ def create_tool_instance(tool_id: int, payload: ToolInstanceUpsert, db: Session
         LastCalibration=payload.lastCalibration or tool.LastCalibration,
         NextCalibration=payload.nextCalibration or tool.NextCalibration,
         ImagePath=payload.imagePath or tool.ImagePath,
-        CreatedDate=datetime.now(),
-        UpdatedDate=datetime.now(),
+        CreatedDate=now,
+        UpdatedDate=now,
     )
     apply_instance_certification_schedule(instance)
     db.add(instance)
     db.commit()
-    db.refresh(instance)
+    _invalidate_equipment_cache()
     return serialize_instance(instance)
 
 
 @app.put("/api/equipment/instances/{instance_id}")
 def update_tool_instance(instance_id: int, payload: ToolInstanceUpsert, db: Session = Depends(get_asset_db)):
+    now = datetime.now()
     instance = db.get(ToolInstance, instance_id)
     if not instance:
         raise HTTPException(status_code=404, detail="Tool instance not found")
 
     tool = db.get(Tool, instance.ToolID)
 
-    for field, value in payload.model_dump(exclude_unset=True).items():
+    for field in payload.model_fields_set:
         if field == "toolInstanceID":
             continue
-        setattr(instance, _map_instance_field(field), value)
+        setattr(instance, _INSTANCE_FIELD_ATTRS[field], getattr(payload, field))
 
     if tool:
         instance.RequiresCertification = tool.RequiresCertification
@@ -754,10 +943,10 @@ def update_tool_instance(instance_id: int, payload: ToolInstanceUpsert, db: Sess
     if not instance.SerialNumber and instance.InstanceNumber:
         instance.SerialNumber = build_instance_serial(tool.SerialNumber if tool else None, instance.InstanceNumber)
 
-    instance.UpdatedDate = datetime.now()
+    instance.UpdatedDate = now
     apply_instance_certification_schedule(instance)
     db.commit()
-    db.refresh(instance)
+    _invalidate_equipment_cache()
     return serialize_instance(instance)
 
 
@@ -769,6 +958,7 @@ def delete_tool_instance(instance_id: int, db: Session = Depends(get_asset_db)):
 
     db.delete(instance)
     db.commit()
+    _invalidate_equipment_cache()
     return {"message": "Deleted"}
 
 
@@ -777,42 +967,85 @@ def upload_equipment_image(file: UploadFile = File(...)):
     if file.content_type not in {"image/jpeg", "image/png", "image/webp", "image/gif"}:
         raise HTTPException(status_code=400, detail="Unsupported file type. Please upload an image (jpg, png, webp, gif).")
 
-    UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
     ext = os.path.splitext(file.filename or "")[1]
     filename = f"{uuid.uuid4().hex}{ext}"
     target = UPLOADS_DIR / filename
 
-    with target.open("wb") as output:
-        output.write(file.file.read())
+    head = file.file.read(UPLOAD_COPY_CHUNK_SIZE)
+    if not _is_image_signature(head):
+        raise HTTPException(status_code=400, detail="Unsupported file type. Please upload an image (jpg, png, webp, gif).")
+
+    written = len(head)
+    with _open_upload_target(target) as output:
+        output.write(head)
+        while chunk := file.file.read(UPLOAD_COPY_CHUNK_SIZE):
+            written += len(chunk)
+            if written > MAX_IMAGE_BYTES:
+                break
+            output.write(chunk)
+    if written > MAX_IMAGE_BYTES:
+        target.unlink(missing_ok=True)
+        raise HTTPException(status_code=413, detail="Image is too large.")
 
     return {"path": f"/uploads/tools/{filename}"}
 
 
-@app.get("/api/rentals")
+# Everything serialize_rental touches: the line items plus each line's tool and instance.
+# Tool/ToolInstance are many-to-one, so they ride along as joins on the items SELECT.
+RENTAL_FULL_OPTIONS = (
+    selectinload(Rental.RentalItems).options(
+        joinedload(RentalItem.Tool),
+        joinedload(RentalItem.ToolInstance),
+    ),
+)
+
+# Prebuilt statements for the hot rental loads. Reusing the same Select objects skips rebuilding the
+# option tree per request and lets SQLAlchemy reuse their memoized cache keys.
+RENTALS_LIST_STMT = select(Rental).options(*RENTAL_FULL_OPTIONS).order_by(Rental.CreatedDate.desc())
+RENTAL_BY_ID_STMT = select(Rental).options(*RENTAL_FULL_OPTIONS).where(Rental.RentalID == bindparam("rental_id"))
+RENTAL_BY_NUMBER_STMT = (
+    select(Rental).options(*RENTAL_FULL_OPTIONS).where(Rental.RentalNumber == bindparam("rental_number"))
+)
+RENTAL_WITH_ITEMS_BY_ID_STMT = (
+    select(Rental).options(selectinload(Rental.RentalItems)).where(Rental.RentalID == bindparam("rental_id"))
+)
+RENTAL_WITH_ITEMS_BY_NUMBER_STMT = (
+    select(Rental).options(selectinload(Rental.RentalItems)).where(Rental.RentalNumber == bindparam("rental_number"))
+)
+RENTAL_WITH_INSTANCES_BY_ID_STMT = (
+    select(Rental)
+    .options(selectinload(Rental.RentalItems).joinedload(RentalItem.ToolInstance))
+    .where(Rental.RentalID == bindparam("rental_id"))
+)
+
+
+def _orjson_default(value):
+    # Numeric columns load as Decimal; mirror jsonable_encoder's int/float split.
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    raise TypeError
+
+
+class RentalJSONResponse(ORJSONResponse):
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+@app.get("/api/rentals", response_class=RentalJSONResponse)
 def get_rentals(db: Session = Depends(get_asset_db)):
-    stmt = (
-        select(Rental)
-        .options(selectinload(Rental.RentalItems).selectinload(RentalItem.Tool))
-        .options(selectinload(Rental.RentalItems).selectinload(RentalItem.ToolInstance))
-        .order_by(Rental.CreatedDate.desc())
-    )
-    rentals = db.execute(stmt).scalars().all()
+    rentals = db.execute(RENTALS_LIST_STMT).scalars().all()
+    today = date.today()
     for rental in rentals:
-        _apply_runtime_state(rental)
+        _apply_runtime_state(rental, today)
     employee_directory = _safe_employee_directory()
     db.commit()
-    return [_serialize_rental_with_employee(rental, employee_directory) for rental in rentals]
+    # Returning the response directly skips jsonable_encoder, which walks every nested item dict.
+    return RentalJSONResponse([_serialize_rental_with_employee(rental, employee_directory) for rental in rentals])
 
 
 @app.get("/api/rentals/{rental_id}")
 def get_rental(rental_id: int, db: Session = Depends(get_asset_db)):
-    stmt = (
-        select(Rental)
-        .options(selectinload(Rental.RentalItems).selectinload(RentalItem.Tool))
-        .options(selectinload(Rental.RentalItems).selectinload(RentalItem.ToolInstance))
-        .where(Rental.RentalID == rental_id)
-    )
-    rental = db.execute(stmt).scalars().first()
+    rental = db.execute(RENTAL_BY_ID_STMT, {"rental_id": rental_id}).scalar_one_or_none()
     if not rental:
         raise HTTPException(status_code=404, detail="Rental not found")
     _apply_runtime_state(rental)
@@ -823,13 +1056,7 @@ def get_rental(rental_id: int, db: Session = Depends(get_asset_db)):
 
 @app.get("/api/offers/{offer_number}")
 def get_offer_by_number(offer_number: str, db: Session = Depends(get_asset_db)):
-    stmt = (
-        select(Rental)
-        .options(selectinload(Rental.RentalItems).selectinload(RentalItem.Tool))
-        .options(selectinload(Rental.RentalItems).selectinload(RentalItem.ToolInstance))
-        .where(Rental.RentalNumber == offer_number.upper())
-    )
-    offer = db.execute(stmt).scalars().first()
+    offer = db.execute(RENTAL_BY_NUMBER_STMT, {"rental_number": offer_number.upper()}).scalars().first()
     if not offer or _normalize_state(offer.Status) != "Offer":
         raise HTTPException(status_code=404, detail="Offer not found")
     return _serialize_rental_with_employee(offer, _safe_employee_directory())
@@ -843,12 +1070,7 @@ def checkout_offer(
     db: Session = Depends(get_asset_db),
     x_session_token: str | None = Header(None, alias="X-Session-Token"),
 ):
-    stmt = (
-        select(Rental)
-        .options(selectinload(Rental.RentalItems))
-        .where(Rental.RentalNumber == offer_number.upper())
-    )
-    offer = db.execute(stmt).scalars().first()
+    offer = db.execute(RENTAL_WITH_ITEMS_BY_NUMBER_STMT, {"rental_number": offer_number.upper()}).scalars().first()
     if not offer or _normalize_state(offer.Status) != "Offer":
         raise HTTPException(status_code=404, detail="Offer not found")
 
@@ -874,23 +1096,22 @@ def checkout_offer(
         ],
     )
 
-    created = create_rental(request, checkout_payload, db, x_session_token)
+    rental, employee_directory = _create_rental_core(request, checkout_payload, db, x_session_token)
     _transition_state(offer, "Closed")
     offer.UpdatedDate = datetime.now()
     db.commit()
-    log_audit(
-        db,
+    _enqueue_create_audit(rental)
+    enqueue_audit(
         "Rental",
         offer.RentalID,
         "OfferCheckout",
-        f"Offer converted to reservation {created['rentalNumber']}",
+        f"Offer converted to reservation {rental.RentalNumber}",
         user_id=actor_employee_id,
     )
-    db.commit()
-    return created
+    return _serialize_rental_with_employee(rental, employee_directory)
 
 
-@app.get("/api/rentals/availability/by-tool")
+@app.get("/api/rentals/availability/by-tool", response_class=RentalJSONResponse)
 def get_rental_availability(
     tool_id: int = Query(..., alias="toolID"),
     start_date: date = Query(..., alias="startDate"),
@@ -903,15 +1124,17 @@ def get_rental_availability(
 
     wanted = max(1, int(quantity))
     available_instances = _get_available_instances(db, tool_id, start_date, end_date)
-    return {
-        "toolID": tool_id,
-        "startDate": start_date,
-        "endDate": end_date,
-        "requestedQuantity": wanted,
-        "availableCount": len(available_instances),
-        "deficit": max(0, wanted - len(available_instances)),
-        "availableInstanceIDs": [instance.ToolInstanceID for instance in available_instances],
-    }
+    return RentalJSONResponse(
+        {
+            "toolID": tool_id,
+            "startDate": start_date,
+            "endDate": end_date,
+            "requestedQuantity": wanted,
+            "availableCount": len(available_instances),
+            "deficit": max(0, wanted - len(available_instances)),
+            "availableInstanceIDs": [instance.ToolInstanceID for instance in available_instances],
+        }
+    )
 
 
 @app.post("/api/kiosk/lend")
@@ -921,12 +1144,13 @@ def kiosk_lend(request: Request, payload: KioskLendRequest, db: Session = Depend
     pin = (payload.pinCode or "").strip()
     if len(pin) < 4:
         raise HTTPException(status_code=400, detail="PIN code must be at least 4 characters.")
-    if not verify_password(db, employee_id, pin):
-        raise HTTPException(status_code=401, detail="Invalid credentials.")
     if payload.endDate < payload.startDate:
         raise HTTPException(status_code=400, detail="endDate must be on or after startDate.")
     if not payload.rentalItems:
         raise HTTPException(status_code=400, detail="No rental items supplied.")
+    # The PIN hash is the expensive step, so it only runs once the request could otherwise succeed.
+    if not verify_password(db, employee_id, pin):
+        raise HTTPException(status_code=401, detail="Invalid credentials.")
 
     base_notes = f"Kiosk lend by employee {employee_id}"
     photo_path = None
@@ -942,53 +1166,38 @@ def kiosk_lend(request: Request, payload: KioskLendRequest, db: Session = Depend
         endDate=payload.endDate,
         notes=base_notes,
         status="Reserved",
+        # The items were validated with the request body; passing the models through skips a second pass.
         rentalItems=[
-            {
-                "toolID": item.toolID,
-                "toolInstanceID": item.toolInstanceID,
-                "quantity": item.quantity,
-                "dailyCost": item.dailyCost,
-                "assignmentMode": item.assignmentMode or ("manual" if item.toolInstanceID else "auto"),
-                "allowDeficit": item.allowDeficit,
-            }
+            item
+            if item.assignmentMode
+            else item.model_copy(update={"assignmentMode": "manual" if item.toolInstanceID else "auto"})
             for item in payload.rentalItems
         ],
     )
 
-    created = create_rental(request, create_payload, db, None)
-
-    stmt = (
-        select(Rental)
-        .options(selectinload(Rental.RentalItems).selectinload(RentalItem.Tool))
-        .options(selectinload(Rental.RentalItems).selectinload(RentalItem.ToolInstance))
-        .where(Rental.RentalID == int(created["rentalID"]))
-    )
-    rental = db.execute(stmt).scalars().first()
-    if not rental:
-        raise HTTPException(status_code=500, detail="Could not create kiosk rental.")
-
+    rental, _ = _create_rental_core(request, create_payload, db, None)
+    initial_status = rental.Status
     _activate_rental(db, rental, approved_by=employee_id)
     if photo_path:
         rental.CheckoutCondition = f"Kiosk photo: {photo_path}"
     db.commit()
-    log_audit(db, "Rental", rental.RentalID, "KioskLend", f"Employee {employee_id}")
-    db.commit()
+    _enqueue_create_audit(rental, initial_status)
+    enqueue_audit("Rental", rental.RentalID, "KioskLend", f"Employee {employee_id}")
 
-    pickup_lines = []
-    for item in rental.RentalItems:
-        if not item.ToolInstance:
-            continue
-        pickup_lines.append(
-            {
-                "toolID": item.ToolID,
-                "toolName": item.Tool.ToolName if item.Tool else f"Tool {item.ToolID}",
-                "toolInstanceID": item.ToolInstanceID,
-                "serialNumber": item.ToolInstance.SerialNumber,
-                "locationCode": item.ToolInstance.LocationCode,
-                "warehouseID": item.ToolInstance.WarehouseID,
-                "quantity": int(item.Quantity or 1),
-            }
-        )
+    # Lines without an instance id have nothing to pick, so skip them before touching the relationships.
+    pickup_lines = [
+        {
+            "toolID": item.ToolID,
+            "toolName": item.Tool.ToolName if item.Tool else f"Tool {item.ToolID}",
+            "toolInstanceID": item.ToolInstanceID,
+            "serialNumber": instance.SerialNumber,
+            "locationCode": instance.LocationCode,
+            "warehouseID": instance.WarehouseID,
+            "quantity": int(item.Quantity or 1),
+        }
+        for item in rental.RentalItems
+        if item.ToolInstanceID and (instance := item.ToolInstance)
+    ]
 
     return {
         "rental": _serialize_rental_with_employee(rental, {str(employee_id): employee_entry}),
@@ -997,13 +1206,13 @@ def kiosk_lend(request: Request, payload: KioskLendRequest, db: Session = Depend
     }
 
 
-@app.post("/api/rentals")
-def create_rental(
+def _create_rental_core(
     request: Request,
     payload: CreateRentalDto,
-    db: Session = Depends(get_asset_db),
-    x_session_token: str | None = Header(None, alias="X-Session-Token"),
-):
+    db: Session,
+    x_session_token: str | None,
+) -> tuple[Rental, dict[str, dict[str, str]]]:
+    # Flushes but does not commit; callers own the transaction.
     session = _get_active_session(request, x_session_token)
     requested_employee = int(session.get("employeeID")) if session else payload.employeeID
     employee_id = _resolve_employee_number_or_400(requested_employee)
@@ -1015,6 +1224,7 @@ def create_rental(
     if initial_status not in {"Offer", "Reserved"}:
         raise HTTPException(status_code=400, detail="Initial status must be Offer or Reserved.")
 
+    now = datetime.now()
     rental = Rental(
         EmployeeID=employee_id,
         Purpose=payload.purpose,
@@ -1024,17 +1234,32 @@ def create_rental(
         Notes=payload.notes,
         Status=initial_status,
         RentalNumber="TEMP",
-        CreatedDate=datetime.now(),
-        UpdatedDate=datetime.now(),
+        CreatedDate=now,
+        UpdatedDate=now,
     )
 
     rental.RentalNumber = generate_offer_number(db) if initial_status == "Offer" else generate_rental_number(db, "RNT")
 
+    # Load the tools once with just the columns pricing and serialize_rental read, and hand them to the
+    # new lines so serializing the response does not lazy-load each line's tool.
+    tool_ids = {item.toolID for item in payload.rentalItems}
+    tools_by_id: dict[int, Tool] = {}
+    if tool_ids:
+        tools_by_id = {
+            tool.ToolID: tool
+            for tool in db.execute(
+                select(Tool)
+                .options(load_only(Tool.ToolID, Tool.ToolName, Tool.SerialNumber, Tool.DailyRentalCost))
+                .where(Tool.ToolID.in_(tool_ids))
+            ).scalars()
+        }
+
     for item in payload.rentalItems:
-        tool = db.get(Tool, item.toolID)
-        if not tool:
+        tool = tools_by_id.get(item.toolID)
+        if tool is None:
             raise HTTPException(status_code=400, detail=f"Tool {item.toolID} not found.")
-        snapshot_daily_cost = float(item.dailyCost) if item.dailyCost is not None else float(tool.DailyRentalCost or 0)
+        tool_daily_cost = tool.DailyRentalCost
+        snapshot_daily_cost = float(item.dailyCost) if item.dailyCost is not None else float(tool_daily_cost or 0)
 
         requested_quantity = max(1, int(item.quantity or 1))
         assignment_mode = (item.assignmentMode or ("manual" if item.toolInstanceID else "auto")).lower()
@@ -1046,6 +1271,7 @@ def create_rental(
             rental.RentalItems.append(
                 RentalItem(
                     ToolID=item.toolID,
+                    Tool=tool,
                     ToolInstanceID=None,
                     Quantity=requested_quantity,
                     DailyCost=snapshot_daily_cost,
@@ -1060,12 +1286,21 @@ def create_rental(
 
     recalc_total_cost(rental)
     db.add(rental)
-    db.commit()
-    db.refresh(rental)
-    log_audit(db, "Rental", rental.RentalID, "CreateRental", f"Created with status {initial_status}", user_id=employee_id)
-    db.commit()
+    db.flush()
+    return rental, {str(employee_id): employee_entry}
 
-    return _serialize_rental_with_employee(rental, {str(employee_id): employee_entry})
+
+@app.post("/api/rentals")
+def create_rental(
+    request: Request,
+    payload: CreateRentalDto,
+    db: Session = Depends(get_asset_db),
+    x_session_token: str | None = Header(None, alias="X-Session-Token"),
+):
+    rental, employee_directory = _create_rental_core(request, payload, db, x_session_token)
+    db.commit()
+    _enqueue_create_audit(rental)
+    return _serialize_rental_with_employee(rental, employee_directory)
 
 
 @app.post("/api/rentals/{rental_id}/approve")
@@ -1091,44 +1326,39 @@ def decide_rental(
     x_session_token: str | None = Header(None, alias="X-Session-Token"),
 ):
     payload.operatorUserID = _resolve_actor_user_id(payload.operatorUserID, request, x_session_token)
-    stmt = (
-        select(Rental)
-        .options(selectinload(Rental.RentalItems))
-        .where(Rental.RentalID == rental_id)
-    )
-    rental = db.execute(stmt).scalars().first()
+    rental = db.execute(RENTAL_BY_ID_STMT, {"rental_id": rental_id}).scalar_one_or_none()
     if not rental:
         raise HTTPException(status_code=404, detail="Rental not found")
     current = _apply_runtime_state(rental)
     if current != "Reserved":
         raise HTTPException(status_code=400, detail="Reservation is not pending decision.")
 
+    now = datetime.now()
     if payload.decision == "reject":
         reason = (payload.reason or "").strip()
         if not reason:
             raise HTTPException(status_code=400, detail="Reject reason is required.")
         _transition_state(rental, "Closed")
         rental.Notes = (rental.Notes + "\n" if rental.Notes else "") + f"Rejected: {reason}"
-        rental.UpdatedDate = datetime.now()
+        rental.UpdatedDate = now
         _release_reserved_instances(db, rental)
         db.add(
             NotificationQueue(
                 RentalID=rental.RentalID,
                 NotificationType="ReservationRejected",
                 Payload=f"Reservation {rental.RentalNumber} rejected: {reason}",
-                CreatedAt=datetime.now(),
+                CreatedAt=now,
             )
         )
         db.commit()
-        log_audit(db, "Rental", rental_id, "Reject", f"Rejected by {payload.operatorUserID}: {reason}", user_id=payload.operatorUserID)
-        db.commit()
+        enqueue_audit("Rental", rental_id, "Reject", f"Rejected by {payload.operatorUserID}: {reason}", user_id=payload.operatorUserID)
         return {"message": "Reservation rejected", "rentalNumber": rental.RentalNumber}
 
     # Approve flow: keep status Reserved (not invoiceable), allocate what is available.
     if not rental.ApprovalDate:
         rental.ApprovalDate = date.today()
     rental.ApprovedBy = payload.operatorUserID
-    rental.UpdatedDate = datetime.now()
+    rental.UpdatedDate = now
     _apply_shortage_actions(rental, payload.shortageActions, payload.operatorUserID)
     allocation = _allocate_reservation_lines(db, rental, payload.operatorUserID)
 
@@ -1137,23 +1367,35 @@ def decide_rental(
             RentalID=rental.RentalID,
             NotificationType="ReservationApproved",
             Payload=f"Reservation {rental.RentalNumber} approved. Reserved={allocation['reservedCount']} shortage={allocation['shortageCount']}",
-            CreatedAt=datetime.now(),
+            CreatedAt=now,
         )
     )
     recalc_total_cost(rental)
     db.commit()
-    log_audit(
-        db,
+    enqueue_audit(
         "Rental",
         rental_id,
         "ApproveReservation",
         f"Approved by {payload.operatorUserID}; reserved={allocation['reservedCount']} shortage={allocation['shortageCount']}",
         user_id=payload.operatorUserID,
     )
-    db.commit()
     return {"message": "Reservation approved", "allocation": allocation, "rental": _serialize_rental_with_employee(rental, _safe_employee_directory())}
 
 
+def _match_marked_lines(
+    rental: Rental, marks: list[MarkRentalItemDto] | list[ReceiveRentalItemDto]
+) -> list[tuple[MarkRentalItemDto | ReceiveRentalItemDto, RentalItem]]:
+    item_map = {item.RentalItemID: item for item in rental.RentalItems}
+    # Reject unknown lines before any line is touched, not halfway through the loop.
+    unknown = sorted({mark.rentalItemID for mark in marks} - item_map.keys())
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"RentalItem {', '.join(str(item_id) for item_id in unknown)} not found in rental.",
+        )
+    return [(mark, item_map[mark.rentalItemID]) for mark in marks]
+
+
 @app.post("/api/rentals/{rental_id}/mark-items-for-rental")
 def mark_items_for_rental(
     request: Request,
@@ -1163,12 +1405,7 @@ def mark_items_for_rental(
     x_session_token: str | None = Header(None, alias="X-Session-Token"),
 ):
     payload.operatorUserID = _resolve_actor_user_id(payload.operatorUserID, request, x_session_token)
-    stmt = (
-        select(Rental)
-        .options(selectinload(Rental.RentalItems))
-        .where(Rental.RentalID == rental_id)
-    )
-    rental = db.execute(stmt).scalars().first()
+    rental = db.execute(RENTAL_BY_ID_STMT, {"rental_id": rental_id}).scalar_one_or_none()
     if not rental:
         raise HTTPException(status_code=404, detail="Rental not found")
 
@@ -1178,15 +1415,30 @@ def mark_items_for_rental(
     if not payload.items:
         raise HTTPException(status_code=400, detail="No marked items supplied.")
 
-    item_map = {item.RentalItemID: item for item in rental.RentalItems}
+    marked_lines = _match_marked_lines(rental, payload.items)
     picked_any = False
-    now_iso = datetime.now().isoformat()
+    now = datetime.now()
+    now_iso = now.isoformat()
     seen_instance_ids: set[int] = set()
+    new_items: list[dict] = []
+
+    # Load every chosen instance (and its overlaps) up front instead of per line. The instance rows are
+    # locked before the overlap check, so a concurrent pick of the same instance waits for this
+    # transaction and then sees its rental lines. The mssql dialect drops FOR UPDATE, hence the hint.
+    chosen_instance_ids = {int(x) for mark in payload.items for x in (mark.toolInstanceIDs or [])}
+    instances_by_id: dict[int, ToolInstance] = {}
+    if chosen_instance_ids:
+        instances_by_id = {
+            instance.ToolInstanceID: instance
+            for instance in db.execute(
+                select(ToolInstance)
+                .where(ToolInstance.ToolInstanceID.in_(chosen_instance_ids))
+                .with_hint(ToolInstance, "WITH (UPDLOCK, ROWLOCK)", "mssql")
+            ).scalars()
+        }
+    overlapping_ids = _find_overlapping_instance_ids(db, chosen_instance_ids, rental.StartDate, rental.EndDate)
 
-    for mark in payload.items:
-        line = item_map.get(mark.rentalItemID)
-        if not line:
-            raise HTTPException(status_code=400, detail=f"RentalItem {mark.rentalItemID} not found in rental.")
+    for mark, line in marked_lines:
 
         if int(line.Quantity or 0) <= 0:
             raise HTTPException(status_code=400, detail=f"RentalItem {line.RentalItemID} has no remaining quantity.")
@@ -1207,10 +1459,10 @@ def mark_items_for_rental(
                 operator_user_id=payload.operatorUserID,
                 extra={"pickedAt": now_iso, "notes": mark.notes, "serialInput": mark.serialInput},
             )
-            instance = db.get(ToolInstance, line.ToolInstanceID)
+            instance = line.ToolInstance
             if instance:
                 instance.Status = "In Rental"
-                instance.UpdatedDate = datetime.now()
+                instance.UpdatedDate = now
             picked_any = True
             continue
 
@@ -1238,15 +1490,17 @@ def mark_items_for_rental(
                 tool_instance_id=instance_id,
                 start_date=rental.StartDate,
                 end_date=rental.EndDate,
+                instance=instances_by_id.get(instance_id),
+                overlapping_ids=overlapping_ids,
             )
 
         for instance_id in chosen_ids:
-            instance = db.get(ToolInstance, instance_id)
+            instance = instances_by_id.get(instance_id)
             if instance:
                 instance.Status = "In Rental"
-                instance.UpdatedDate = datetime.now()
-            db.add(
-                RentalItem(
+                instance.UpdatedDate = now
+            new_items.append(
+                dict(
                     RentalID=rental.RentalID,
                     ToolID=line.ToolID,
                     ToolInstanceID=instance_id,
@@ -1264,8 +1518,8 @@ def mark_items_for_rental(
 
         untracked_qty = pick_qty - len(chosen_ids)
         if untracked_qty > 0:
-            db.add(
-                RentalItem(
+            new_items.append(
+                dict(
                     RentalID=rental.RentalID,
                     ToolID=line.ToolID,
                     ToolInstanceID=None,
@@ -1292,20 +1546,22 @@ def mark_items_for_rental(
     if picked_any and _normalize_state(rental.Status) == "Reserved":
         _transition_state(rental, "Active")
         rental.ActualStart = rental.ActualStart or date.today()
-    rental.UpdatedDate = datetime.now()
+    rental.UpdatedDate = now
 
+    if new_items:
+        # One executemany INSERT for all split-off lines instead of a flush INSERT per row.
+        db.execute(insert(RentalItem), new_items)
     recalc_total_cost(rental)
     db.commit()
-    db.refresh(rental)
-    log_audit(
-        db,
+    enqueue_audit(
         "Rental",
         rental.RentalID,
         "MarkItemsForRental",
         f"Items marked by {payload.operatorUserID}",
         user_id=payload.operatorUserID,
     )
-    db.commit()
+    # Only the items collection is stale (split-off lines were bulk-inserted); the rest is current.
+    db.refresh(rental, attribute_names=["RentalItems"])
     return _serialize_rental_with_employee(rental, _safe_employee_directory())
 
 
@@ -1318,13 +1574,7 @@ def extend_rental(
     x_session_token: str | None = Header(None, alias="X-Session-Token"),
 ):
     actor_user_id = _resolve_actor_user_id(None, request, x_session_token)
-    stmt = (
-        select(Rental)
-        .options(selectinload(Rental.RentalItems))
-        .options(selectinload(Rental.RentalItems).selectinload(RentalItem.ToolInstance))
-        .where(Rental.RentalID == rental_id)
-    )
-    rental = db.execute(stmt).scalars().first()
+    rental = db.execute(RENTAL_WITH_INSTANCES_BY_ID_STMT, {"rental_id": rental_id}).scalar_one_or_none()
     if not rental:
         raise HTTPException(status_code=404, detail="Rental not found")
 
@@ -1334,17 +1584,18 @@ def extend_rental(
     if payload.newEndDate < rental.StartDate:
         raise HTTPException(status_code=400, detail="newEndDate must be on or after StartDate.")
 
+    conflicting_ids = _find_overlapping_instance_ids(
+        db,
+        {item.ToolInstanceID for item in rental.RentalItems if item.ToolInstanceID},
+        rental.StartDate,
+        payload.newEndDate,
+        exclude_rental_id=rental.RentalID,
+    )
     for item in rental.RentalItems:
         if item.ToolInstance and item.ToolInstance.RequiresCertification:
             if not item.ToolInstance.NextCalibration or item.ToolInstance.NextCalibration < payload.newEndDate:
                 raise HTTPException(status_code=400, detail="One or more items expire before the new end date.")
-        if item.ToolInstanceID and _has_instance_overlap(
-            db=db,
-            tool_instance_id=item.ToolInstanceID,
-            start_date=rental.StartDate,
-            end_date=payload.newEndDate,
-            exclude_rental_id=rental.RentalID,
-        ):
+        if item.ToolInstanceID in conflicting_ids:
             raise HTTPException(
                 status_code=400,
                 detail=f"Tool instance {item.ToolInstanceID} is already reserved for that extension range.",
@@ -1355,8 +1606,7 @@ def extend_rental(
     recalc_total_cost(rental)
 
     db.commit()
-    log_audit(db, "Rental", rental_id, "Extend", f"Extended to {payload.newEndDate}", user_id=actor_user_id)
-    db.commit()
+    enqueue_audit("Rental", rental_id, "Extend", f"Extended to {payload.newEndDate}", user_id=actor_user_id)
     return {"message": "Rental Extended"}
 
 
@@ -1368,26 +1618,29 @@ def cancel_rental(
     x_session_token: str | None = Header(None, alias="X-Session-Token"),
 ):
     actor_user_id = _resolve_actor_user_id(None, request, x_session_token)
-    rental = db.get(Rental, rental_id)
-    if not rental:
+    # Closing an offer only flips Status, so do it as a guarded UPDATE without loading the rental.
+    closed = db.execute(
+        update(Rental)
+        .where(Rental.RentalID == rental_id, Rental.Status == "Offer")
+        .values(Status="Closed", UpdatedDate=datetime.now())
+    ).rowcount
+    if closed:
+        db.commit()
+        enqueue_audit("Rental", rental_id, "Cancel", "Rental closed", user_id=actor_user_id)
+        return {"message": "Rental Closed"}
+
+    # decide_rental loads the rental with its items itself; only the status is needed to route there.
+    status_row = db.execute(select(Rental.Status).where(Rental.RentalID == rental_id)).first()
+    if not status_row:
         raise HTTPException(status_code=404, detail="Rental not found")
-    current = _apply_runtime_state(rental)
-    if current == "Reserved":
-        decision = ReservationDecisionRequest(
-            decision="reject",
-            reason="Cancelled by warehouse dispatcher",
-            operatorUserID=actor_user_id,
-        )
-        return decide_rental(request, rental_id, decision, db, x_session_token)
-    if current not in {"Offer"}:
+    if _normalize_state(status_row.Status) != "Reserved":
         raise HTTPException(status_code=400, detail="Only Offer/Reserved rentals can be closed by cancel.")
-
-    _transition_state(rental, "Closed")
-    rental.UpdatedDate = datetime.now()
-    db.commit()
-    log_audit(db, "Rental", rental_id, "Cancel", "Rental closed", user_id=actor_user_id)
-    db.commit()
-    return {"message": "Rental Closed"}
+    decision = ReservationDecisionRequest(
+        decision="reject",
+        reason="Cancelled by warehouse dispatcher",
+        operatorUserID=actor_user_id,
+    )
+    return decide_rental(request, rental_id, decision, db, x_session_token)
 
 
 @app.post("/api/rentals/{rental_id}/return")
@@ -1399,13 +1652,7 @@ def return_rental(
     x_session_token: str | None = Header(None, alias="X-Session-Token"),
 ):
     actor_user_id = _resolve_actor_user_id(None, request, x_session_token)
-    stmt = (
-        select(Rental)
-        .options(selectinload(Rental.RentalItems))
-        .options(selectinload(Rental.RentalItems).selectinload(RentalItem.ToolInstance))
-        .where(Rental.RentalID == rental_id)
-    )
-    rental = db.execute(stmt).scalars().first()
+    rental = db.execute(RENTAL_WITH_ITEMS_BY_ID_STMT, {"rental_id": rental_id}).scalar_one_or_none()
     if not rental:
         raise HTTPException(status_code=404, detail="Rental not found")
     current = _apply_runtime_state(rental)
@@ -1414,8 +1661,8 @@ def return_rental(
 
     apply_return_updates(db, rental, payload.condition, payload.notes)
     db.commit()
-    log_audit(db, "Rental", rental_id, "Return", "Rental returned", user_id=actor_user_id)
-    db.commit()
+    enqueue_audit("Rental", rental_id, "Return", "Rental returned", user_id=actor_user_id)
+    _invalidate_equipment_cache()
     return {"message": "Return processed successfully"}
 
 
@@ -1428,12 +1675,7 @@ def receive_marked_items(
     x_session_token: str | None = Header(None, alias="X-Session-Token"),
 ):
     payload.operatorUserID = _resolve_actor_user_id(payload.operatorUserID, request, x_session_token)
-    stmt = (
-        select(Rental)
-        .options(selectinload(Rental.RentalItems))
-        .where(Rental.RentalID == rental_id)
-    )
-    rental = db.execute(stmt).scalars().first()
+    rental = db.execute(RENTAL_BY_ID_STMT, {"rental_id": rental_id}).scalar_one_or_none()
     if not rental:
         raise HTTPException(status_code=404, detail="Rental not found")
     current = _apply_runtime_state(rental)
@@ -1442,13 +1684,12 @@ def receive_marked_items(
     if not payload.items:
         raise HTTPException(status_code=400, detail="No marked items supplied.")
 
-    item_map = {item.RentalItemID: item for item in rental.RentalItems}
-    receive_iso = datetime.now().isoformat()
+    marked_lines = _match_marked_lines(rental, payload.items)
+    now = datetime.now()
+    receive_iso = now.isoformat()
+    new_items: list[dict] = []
 
-    for mark in payload.items:
-        line = item_map.get(mark.rentalItemID)
-        if not line:
-            raise HTTPException(status_code=400, detail=f"RentalItem {mark.rentalItemID} not found in rental.")
+    for mark, line in marked_lines:
 
         remaining = int(line.Quantity or 0)
         if remaining <= 0:
@@ -1466,10 +1707,10 @@ def receive_marked_items(
 
         if line.ToolInstanceID:
             if returned_qty == 1:
-                instance = db.get(ToolInstance, line.ToolInstanceID)
+                instance = line.ToolInstance
                 if instance:
                     instance.Status = "Available"
-                    instance.UpdatedDate = datetime.now()
+                    instance.UpdatedDate = now
                 line.Quantity = 0
                 _mark_line_lifecycle(
                     line,
@@ -1487,8 +1728,8 @@ def receive_marked_items(
             continue
 
         if returned_qty > 0:
-            db.add(
-                RentalItem(
+            new_items.append(
+                dict(
                     RentalID=rental.RentalID,
                     ToolID=line.ToolID,
                     ToolInstanceID=None,
@@ -1512,21 +1753,23 @@ def receive_marked_items(
             extra={"receivedAt": receive_iso, "condition": mark.condition, "notes": mark.notes, "remainingQuantity": int(line.Quantity or 0)},
         )
 
-    rental.UpdatedDate = datetime.now()
+    if new_items:
+        db.execute(insert(RentalItem), new_items)
+    rental.UpdatedDate = now
     if not _rental_has_open_quantity(rental):
         apply_return_updates(db, rental, "Returned via marked items", None)
     recalc_total_cost(rental)
     db.commit()
-    db.refresh(rental)
-    log_audit(
-        db,
+    enqueue_audit(
         "Rental",
         rental.RentalID,
         "ReceiveMarkedItems",
         f"Items received by {payload.operatorUserID}",
         user_id=payload.operatorUserID,
     )
-    db.commit()
+    _invalidate_equipment_cache()
+    # Only the items collection is stale (split-off lines were bulk-inserted); the rest is current.
+    db.refresh(rental, attribute_names=["RentalItems"])
     return _serialize_rental_with_employee(rental, _safe_employee_directory())
 
 
@@ -1539,13 +1782,7 @@ def force_extend_rental(
     x_session_token: str | None = Header(None, alias="X-Session-Token"),
 ):
     actor_user_id = _resolve_actor_user_id(None, request, x_session_token)
-    stmt = (
-        select(Rental)
-        .options(selectinload(Rental.RentalItems))
-        .options(selectinload(Rental.RentalItems).selectinload(RentalItem.ToolInstance))
-        .where(Rental.RentalID == rental_id)
-    )
-    rental = db.execute(stmt).scalars().first()
+    rental = db.execute(RENTAL_WITH_ITEMS_BY_ID_STMT, {"rental_id": rental_id}).scalar_one_or_none()
     if not rental:
         raise HTTPException(status_code=404, detail="Rental not found")
     current = _apply_runtime_state(rental)
@@ -1560,8 +1797,7 @@ def force_extend_rental(
     rental.UpdatedDate = datetime.now()
     recalc_total_cost(rental)
     db.commit()
-    log_audit(db, "Rental", rental_id, "ForceExtend", f"Force-extended to {payload.newEndDate}", user_id=actor_user_id)
-    db.commit()
+    enqueue_audit("Rental", rental_id, "ForceExtend", f"Force-extended to {payload.newEndDate}", user_id=actor_user_id)
     return {"message": "Rental Force Extended"}
 
 
@@ -1574,13 +1810,7 @@ def force_return_rental(
     x_session_token: str | None = Header(None, alias="X-Session-Token"),
 ):
     actor_user_id = _resolve_actor_user_id(None, request, x_session_token)
-    stmt = (
-        select(Rental)
-        .options(selectinload(Rental.RentalItems))
-        .options(selectinload(Rental.RentalItems).selectinload(RentalItem.ToolInstance))
-        .where(Rental.RentalID == rental_id)
-    )
-    rental = db.execute(stmt).scalars().first()
+    rental = db.execute(RENTAL_WITH_ITEMS_BY_ID_STMT, {"rental_id": rental_id}).scalar_one_or_none()
     if not rental:
         raise HTTPException(status_code=404, detail="Rental not found")
     current = _apply_runtime_state(rental)
@@ -1589,8 +1819,8 @@ def force_return_rental(
 
     apply_return_updates(db, rental, payload.condition or "Forced Return", payload.notes)
     db.commit()
-    log_audit(db, "Rental", rental_id, "ForceReturn", "Rental force returned", user_id=actor_user_id)
-    db.commit()
+    enqueue_audit("Rental", rental_id, "ForceReturn", "Rental force returned", user_id=actor_user_id)
+    _invalidate_equipment_cache()
     return {"message": "Rental Force Returned"}
 
 
@@ -1602,32 +1832,42 @@ def mark_rental_lost(
     x_session_token: str | None = Header(None, alias="X-Session-Token"),
 ):
     actor_user_id = _resolve_actor_user_id(None, request, x_session_token)
-    stmt = (
-        select(Rental)
-        .options(selectinload(Rental.RentalItems).selectinload(RentalItem.Tool))
-        .where(Rental.RentalID == rental_id)
-    )
-    rental = db.execute(stmt).scalars().first()
-    if not rental:
+    dates = db.execute(select(Rental.StartDate, Rental.EndDate).where(Rental.RentalID == rental_id)).first()
+    if not dates:
         raise HTTPException(status_code=404, detail="Rental not found")
 
-    rental_days = max(1, (rental.EndDate - rental.StartDate).days)
-    total_loss = 0
-    for item in rental.RentalItems:
-        tool = item.Tool
-        tool_value = float(tool.CurrentValue or tool.PurchaseCost or 0)
-        income = float(item.TotalCost or (float(item.DailyCost or 0) * rental_days * item.Quantity))
-        loss = max(tool_value * 0.65, tool_value - income)
-        total_loss += loss
-
-    rental.Status = "Lost"
-    rental.LossAmount = total_loss
-    rental.LossCalculatedAt = datetime.now()
-    rental.LossReason = "Not returned"
-    rental.UpdatedDate = datetime.now()
-    db.commit()
-    log_audit(db, "Rental", rental_id, "MarkLost", f"Loss {total_loss:.2f}", user_id=actor_user_id)
+    # Per line: max(65% of the tool value, value minus income earned), summed in SQL without loading the items.
+    # NULLIF keeps the old "or" fallbacks, where a zero value or total also fell through to the next term.
+    rental_days = max(1, (dates.EndDate - dates.StartDate).days)
+    tool_value = func.coalesce(func.nullif(Tool.CurrentValue, 0), func.nullif(Tool.PurchaseCost, 0), 0)
+    income = func.coalesce(
+        func.nullif(RentalItem.TotalCost, 0),
+        func.coalesce(RentalItem.DailyCost, 0) * rental_days * RentalItem.Quantity,
+    )
+    line_loss = case((tool_value * 0.65 > tool_value - income, tool_value * 0.65), else_=tool_value - income)
+    total_loss = float(
+        db.execute(
+            select(func.coalesce(func.sum(line_loss), 0))
+            .select_from(RentalItem)
+            .join(Tool, Tool.ToolID == RentalItem.ToolID)
+            .where(RentalItem.RentalID == rental_id)
+        ).scalar_one()
+    )
+
+    now = datetime.now()
+    db.execute(
+        update(Rental)
+        .where(Rental.RentalID == rental_id)
+        .values(
+            Status="Lost",
+            LossAmount=total_loss,
+            LossCalculatedAt=now,
+            LossReason="Not returned",
+            UpdatedDate=now,
+        )
+    )
     db.commit()
+    enqueue_audit("Rental", rental_id, "MarkLost", f"Loss {total_loss:.2f}", user_id=actor_user_id)
     return {"message": "Rental marked as lost", "lossAmount": total_loss}
 
 
@@ -1668,8 +1908,7 @@ def create_warehouse(payload: dict, db: Session = Depends(get_asset_db)):
         IsActive=payload.get("isActive", True),
     )
     db.add(warehouse)
-    db.commit()
-    db.refresh(warehouse)
+    db.flush()
     log_audit(db, "Warehouse", warehouse.WarehouseID, "Create", warehouse.WarehouseName)
     db.commit()
     return {
@@ -1680,32 +1919,31 @@ def create_warehouse(payload: dict, db: Session = Depends(get_asset_db)):
     }
 
 
+_WAREHOUSE_FIELD_MAP = {
+    "warehouseName": "WarehouseName",
+    "description": "Description",
+    "address": "Address",
+    "gridColumns": "GridColumns",
+    "gridRows": "GridRows",
+    "managerID": "ManagerID",
+    "contactPhone": "ContactPhone",
+    "isActive": "IsActive",
+}
+
+
 @app.put("/api/warehouse/{warehouse_id}")
 def update_warehouse(warehouse_id: int, payload: dict, db: Session = Depends(get_asset_db)):
-    warehouse = db.get(Warehouse, warehouse_id)
-    if not warehouse:
+    values = {_WAREHOUSE_FIELD_MAP[key]: value for key, value in payload.items() if key in _WAREHOUSE_FIELD_MAP}
+    if values:
+        found = db.execute(
+            update(Warehouse).where(Warehouse.WarehouseID == warehouse_id).values(**values)
+        ).rowcount
+    else:
+        found = db.get(Warehouse, warehouse_id) is not None
+    if not found:
         raise HTTPException(status_code=404, detail="Warehouse not found")
 
-    for key, value in payload.items():
-        if key == "warehouseName":
-            warehouse.WarehouseName = value
-        elif key == "description":
-            warehouse.Description = value
-        elif key == "address":
-            warehouse.Address = value
-        elif key == "gridColumns":
-            warehouse.GridColumns = value
-        elif key == "gridRows":
-            warehouse.GridRows = value
-        elif key == "managerID":
-            warehouse.ManagerID = value
-        elif key == "contactPhone":
-            warehouse.ContactPhone = value
-        elif key == "isActive":
-            warehouse.IsActive = value
-
-    db.commit()
-    log_audit(db, "Warehouse", warehouse.WarehouseID, "Update", "Warehouse updated")
+    log_audit(db, "Warehouse", warehouse_id, "Update", "Warehouse updated")
     db.commit()
     return {"message": "Updated"}
 
@@ -1713,48 +1951,49 @@ def update_warehouse(warehouse_id: int, payload: dict, db: Session = Depends(get
 @app.get("/api/warehouse/{warehouse_id}/tools")
 def get_warehouse_tools(warehouse_id: int, db: Session = Depends(get_asset_db)):
     stmt = (
-        select(ToolInstance, Tool)
+        select(
+            Tool.ToolID,
+            ToolInstance.ToolInstanceID,
+            Tool.ToolName,
+            ToolInstance.SerialNumber,
+            ToolInstance.Status,
+            ToolInstance.LocationCode,
+        )
         .join(Tool, Tool.ToolID == ToolInstance.ToolID)
         .where(ToolInstance.WarehouseID == warehouse_id)
         .where(ToolInstance.Status != "Retired")
     )
-    tools = db.execute(stmt).all()
     return [
         {
-            "toolID": tool.ToolID,
-            "toolInstanceID": instance.ToolInstanceID,
-            "toolName": tool.ToolName,
-            "serialNumber": instance.SerialNumber,
-            "status": instance.Status,
-            "locationCode": instance.LocationCode,
+            "toolID": tool_id,
+            "toolInstanceID": instance_id,
+            "toolName": tool_name,
+            "serialNumber": serial_number,
+            "status": status,
+            "locationCode": location_code,
         }
-        for instance, tool in tools
+        for tool_id, instance_id, tool_name, serial_number, status, location_code in db.execute(stmt)
     ]
 
 
 @app.get("/api/warehouse/{warehouse_id}/instances")
 def get_warehouse_instances(warehouse_id: int, db: Session = Depends(get_asset_db)):
-    instances = db.execute(
-        select(ToolInstance, Tool)
+    # Plain column rows skip ORM hydration; the labels are already the response keys.
+    rows = db.execute(
+        select(
+            ToolInstance.ToolInstanceID.label("toolInstanceID"),
+            Tool.ToolID.label("toolID"),
+            Tool.ToolName.label("toolName"),
+            ToolInstance.SerialNumber.label("serialNumber"),
+            ToolInstance.Status.label("status"),
+            ToolInstance.Condition.label("condition"),
+            ToolInstance.LocationCode.label("locationCode"),
+        )
         .join(Tool, Tool.ToolID == ToolInstance.ToolID)
         .where(or_(ToolInstance.WarehouseID == warehouse_id, ToolInstance.WarehouseID.is_(None)))
         .order_by(Tool.ToolName, ToolInstance.SerialNumber)
-    ).all()
-
-    payload = []
-    for instance, tool in instances:
-        payload.append(
-            {
-                "toolInstanceID": instance.ToolInstanceID,
-                "toolID": tool.ToolID,
-                "toolName": tool.ToolName,
-                "serialNumber": instance.SerialNumber,
-                "status": instance.Status,
-                "condition": instance.Condition,
-                "locationCode": instance.LocationCode,
-            }
-        )
-    return payload
+    ).mappings()
+    return ORJSONResponse([dict(row) for row in rows])
 
 
 @app.get("/api/warehouse/{warehouse_id}/locations")
@@ -1763,18 +2002,18 @@ def get_warehouse_locations(warehouse_id: int, db: Session = Depends(get_asset_d
         select(WarehouseLocation).where(WarehouseLocation.WarehouseID == warehouse_id)
     ).scalars().all()
 
-    instances = db.execute(
-        select(ToolInstance).where(ToolInstance.WarehouseID == warehouse_id)
-    ).scalars().all()
-
-    occupancy = {}
-    for inst in instances:
-        if not inst.LocationCode:
-            continue
-        occupancy.setdefault(inst.LocationCode, {"total": 0, "out": 0})
-        occupancy[inst.LocationCode]["total"] += 1
-        if inst.Status and inst.Status != "Available":
-            occupancy[inst.LocationCode]["out"] += 1
+    occupancy_rows = db.execute(
+        select(
+            ToolInstance.LocationCode,
+            func.count(),
+            func.sum(case((and_(ToolInstance.Status != "", ToolInstance.Status != "Available"), 1), else_=0)),
+        )
+        .where(ToolInstance.WarehouseID == warehouse_id)
+        .where(ToolInstance.LocationCode.is_not(None))
+        .where(ToolInstance.LocationCode != "")
+        .group_by(ToolInstance.LocationCode)
+    ).all()
+    occupancy = {code: {"total": int(total), "out": int(out or 0)} for code, total, out in occupancy_rows}
 
     payload = []
     for loc in locations:
@@ -1806,37 +2045,32 @@ def generate_warehouse_locations(warehouse_id: int, payload: dict | None = None,
         warehouse.GridColumns = payload.get("gridColumns")
     if payload.get("gridRows") is not None:
         warehouse.GridRows = payload.get("gridRows")
-    db.commit()
 
     columns = int(warehouse.GridColumns or 0)
     rows = int(warehouse.GridRows or 0)
     if columns <= 0 or rows <= 0:
         raise HTTPException(status_code=400, detail="Warehouse grid dimensions not set")
 
-    existing = db.execute(
-        select(WarehouseLocation).where(WarehouseLocation.WarehouseID == warehouse_id)
-    ).scalars().all()
-    existing_codes = {f"{loc.GridColumn}-{loc.GridRow}" for loc in existing}
-
-    created = 0
-    for c in range(columns):
-        col = chr(ord("A") + c)
-        for r in range(1, rows + 1):
-            code = f"{col}-{r}"
-            if code in existing_codes:
-                continue
-            db.add(
-                WarehouseLocation(
-                    WarehouseID=warehouse_id,
-                    GridColumn=col,
-                    GridRow=r,
-                    IsActive=True,
-                    CreatedDate=datetime.now(),
-                )
+    existing_codes = {
+        f"{col}-{row}"
+        for col, row in db.execute(
+            select(WarehouseLocation.GridColumn, WarehouseLocation.GridRow).where(
+                WarehouseLocation.WarehouseID == warehouse_id
             )
-            created += 1
+        )
+    }
+
+    now = datetime.now()
+    new_locations = [
+        dict(WarehouseID=warehouse_id, GridColumn=col, GridRow=r, IsActive=True, CreatedDate=now)
+        for col in (chr(ord("A") + c) for c in range(columns))
+        for r in range(1, rows + 1)
+        if f"{col}-{r}" not in existing_codes
+    ]
+    created = len(new_locations)
+    if new_locations:
+        db.execute(insert(WarehouseLocation), new_locations)
 
-    db.commit()
     log_audit(db, "Warehouse", warehouse_id, "GenerateLocations", f"Created {created} locations")
     db.commit()
     return {"created": created}
@@ -1844,18 +2078,19 @@ def generate_warehouse_locations(warehouse_id: int, payload: dict | None = None,
 
 @app.post("/api/warehouse/assign")
 def assign_tool_location(payload: ToolLocationAssignmentDto, db: Session = Depends(get_asset_db)):
-    instance = db.get(ToolInstance, payload.toolID)
-    if not instance:
+    assigned = db.execute(
+        update(ToolInstance)
+        .where(ToolInstance.ToolInstanceID == payload.toolID)
+        .values(
+            LocationCode=payload.locationCode or None,
+            WarehouseID=payload.warehouseID,
+            UpdatedDate=datetime.now(),
+        )
+    ).rowcount
+    if not assigned:
         raise HTTPException(status_code=404, detail="Tool instance not found")
 
-    instance.LocationCode = payload.locationCode
-    if payload.locationCode == "":
-        instance.LocationCode = None
-    instance.WarehouseID = payload.warehouseID
-    instance.UpdatedDate = datetime.now()
-
-    db.commit()
-    log_audit(db, "ToolInstance", instance.ToolInstanceID, "AssignLocation", f"{payload.locationCode}")
+    log_audit(db, "ToolInstance", payload.toolID, "AssignLocation", f"{payload.locationCode}")
     db.commit()
     return {"message": f"Tool assigned to {payload.locationCode}"}
 
@@ -1864,33 +2099,44 @@ def assign_tool_location(payload: ToolLocationAssignmentDto, db: Session = Depen
 def run_notifications(db: Session = Depends(get_asset_db)):
     today = date.today()
     due_soon = today + timedelta(days=7)
+    now = datetime.now()
 
-    rentals = db.execute(select(Rental)).scalars().all()
-    created = 0
-    for rental in rentals:
-        state = _apply_runtime_state(rental)
-        if state not in {"Active", "Overdue"}:
-            continue
-        if rental.EndDate and today <= rental.EndDate <= due_soon:
-            db.add(
-                NotificationQueue(
-                    RentalID=rental.RentalID,
+    # Flip overdue rentals in SQL, then only read the columns of rentals that need a notification.
+    db.execute(
+        update(Rental)
+        .where(Rental.Status == "Active", Rental.EndDate < today)
+        .values(Status="Overdue", UpdatedDate=now)
+    )
+    due_rows = db.execute(
+        select(Rental.RentalID, Rental.RentalNumber, Rental.EndDate, Rental.Status)
+        .where(Rental.Status.in_(("Active", "Overdue")))
+        .where(or_(Rental.Status == "Overdue", Rental.EndDate.between(today, due_soon)))
+        .order_by(Rental.RentalID)
+    ).all()
+
+    notifications: list[dict] = []
+    for rental_id, rental_number, end_date, status in due_rows:
+        if end_date and today <= end_date <= due_soon:
+            notifications.append(
+                dict(
+                    RentalID=rental_id,
                     NotificationType="DueSoon",
-                    Payload=f"Rental {rental.RentalNumber} due {rental.EndDate}",
-                    CreatedAt=datetime.now(),
+                    Payload=f"Rental {rental_number} due {end_date}",
+                    CreatedAt=now,
                 )
             )
-            created += 1
-        if state == "Overdue":
-            db.add(
-                NotificationQueue(
-                    RentalID=rental.RentalID,
+        if status == "Overdue":
+            notifications.append(
+                dict(
+                    RentalID=rental_id,
                     NotificationType="Overdue",
-                    Payload=f"Rental {rental.RentalNumber} overdue {rental.EndDate}",
-                    CreatedAt=datetime.now(),
+                    Payload=f"Rental {rental_number} overdue {end_date}",
+                    CreatedAt=now,
                 )
             )
-            created += 1
+    created = len(notifications)
+    if notifications:
+        db.execute(insert(NotificationQueue), notifications)
 
     db.commit()
     return {"created": created}
@@ -1913,57 +2159,64 @@ def get_pending_notifications(db: Session = Depends(get_asset_db)):
     ]
 
 
+_TOOL_FIELD_MAP = {
+    "toolID": "ToolID",
+    "toolName": "ToolName",
+    "serialNumber": "SerialNumber",
+    "modelNumber": "ModelNumber",
+    "manufacturer": "Manufacturer",
+    "categoryID": "CategoryID",
+    "description": "Description",
+    "purchaseDate": "PurchaseDate",
+    "purchaseCost": "PurchaseCost",
+    "currentValue": "CurrentValue",
+    "calibrationInterval": "CalibrationInterval",
+    "lastCalibration": "LastCalibration",
+    "nextCalibration": "NextCalibration",
+    "status": "Status",
+    "condition": "Condition",
+    "dailyRentalCost": "DailyRentalCost",
+    "requiresCertification": "RequiresCertification",
+    "warehouseID": "WarehouseID",
+    "locationCode": "LocationCode",
+    "imagePath": "ImagePath",
+}
+
+_INSTANCE_FIELD_MAP = {
+    "toolInstanceID": "ToolInstanceID",
+    "toolID": "ToolID",
+    "serialNumber": "SerialNumber",
+    "instanceNumber": "InstanceNumber",
+    "status": "Status",
+    "condition": "Condition",
+    "warehouseID": "WarehouseID",
+    "locationCode": "LocationCode",
+    "requiresCertification": "RequiresCertification",
+    "calibrationInterval": "CalibrationInterval",
+    "lastCalibration": "LastCalibration",
+    "nextCalibration": "NextCalibration",
+    "imagePath": "ImagePath",
+}
+
+
 def _map_tool_field(field: str) -> str:
-    mapping = {
-        "toolID": "ToolID",
-        "toolName": "ToolName",
-        "serialNumber": "SerialNumber",
-        "modelNumber": "ModelNumber",
-        "manufacturer": "Manufacturer",
-        "categoryID": "CategoryID",
-        "description": "Description",
-        "purchaseDate": "PurchaseDate",
-        "purchaseCost": "PurchaseCost",
-        "currentValue": "CurrentValue",
-        "calibrationInterval": "CalibrationInterval",
-        "lastCalibration": "LastCalibration",
-        "nextCalibration": "NextCalibration",
-        "status": "Status",
-        "condition": "Condition",
-        "dailyRentalCost": "DailyRentalCost",
-        "requiresCertification": "RequiresCertification",
-        "warehouseID": "WarehouseID",
-        "locationCode": "LocationCode",
-        "imagePath": "ImagePath",
-    }
-    return mapping.get(field, field)
+    return _TOOL_FIELD_MAP.get(field, field)
 
 
 def _map_instance_field(field: str) -> str:
-    mapping = {
-        "toolInstanceID": "ToolInstanceID",
-        "toolID": "ToolID",
-        "serialNumber": "SerialNumber",
-        "instanceNumber": "InstanceNumber",
-        "status": "Status",
-        "condition": "Condition",
-        "warehouseID": "WarehouseID",
-        "locationCode": "LocationCode",
-        "requiresCertification": "RequiresCertification",
-        "calibrationInterval": "CalibrationInterval",
-        "lastCalibration": "LastCalibration",
-        "nextCalibration": "NextCalibration",
-        "imagePath": "ImagePath",
-    }
-    return mapping.get(field, field)
+    return _INSTANCE_FIELD_MAP.get(field, field)
 
 
-def _build_lifecycle_payload(
+_TOOL_FIELD_ATTRS = {name: _map_tool_field(name) for name in EquipmentUpsert.model_fields}
+_INSTANCE_FIELD_ATTRS = {name: _map_instance_field(name) for name in ToolInstanceUpsert.model_fields}
+
+
+def _lifecycle_dict(
     state: str,
     operator_user_id: int | None = None,
     extra: dict | None = None,
     previous: dict | None = None,
-) -> str:
+) -> dict:
     payload = dict(previous or {})
     history = list(payload.get("history", []))
     entry = {
@@ -1976,15 +2229,32 @@ def _build_lifecycle_payload(
     history.append(entry)
     payload["state"] = state
     payload["history"] = history
+    return payload
+
+
+def _encode_lifecycle(payload: dict) -> str:
+    encoded = orjson.dumps(payload)
+    if encoded.isascii():
+        return encoded.decode("ascii")
+    # ReturnNotes is a varchar column; keep non-ASCII notes \u-escaped like before.
     return json.dumps(payload, ensure_ascii=True)
 
 
+def _build_lifecycle_payload(
+    state: str,
+    operator_user_id: int | None = None,
+    extra: dict | None = None,
+    previous: dict | None = None,
+) -> str:
+    return _encode_lifecycle(_lifecycle_dict(state, operator_user_id, extra, previous))
+
+
 def _parse_lifecycle_payload(raw: str | None) -> dict:
     if not raw:
         return {}
     try:
-        parsed = json.loads(raw)
-    except (TypeError, json.JSONDecodeError, ValueError):
+        parsed = orjson.loads(raw)
+    except (TypeError, orjson.JSONDecodeError):
         return {}
     return parsed if isinstance(parsed, dict) else {}
 
@@ -1994,43 +2264,47 @@ def _mark_line_lifecycle(
     state: str,
     operator_user_id: int | None = None,
     extra: dict | None = None,
+    previous: dict | None = None,
 ) -> None:
-    previous = _parse_lifecycle_payload(line.ReturnNotes)
-    line.ReturnNotes = _build_lifecycle_payload(
-        state=state,
-        operator_user_id=operator_user_id,
-        extra=extra,
-        previous=previous,
-    )
+    if previous is None:
+        # A line touched twice in one request (shortage action, then superseded) reuses the dict
+        # behind the notes written the first time instead of parsing them back.
+        cached = getattr(line, "_lifecycle_cache", None)
+        if cached and cached[0] is line.ReturnNotes:
+            previous = cached[1]
+        else:
+            previous = _parse_lifecycle_payload(line.ReturnNotes)
+    payload = _lifecycle_dict(state, operator_user_id, extra, previous)
+    line.ReturnNotes = _encode_lifecycle(payload)
+    line._lifecycle_cache = (line.ReturnNotes, payload)
 
 
 def _rental_has_open_quantity(rental: Rental) -> bool:
-    for item in rental.RentalItems:
-        if int(item.Quantity or 0) > 0:
-            return True
-    return False
+    return any((item.Quantity or 0) > 0 for item in rental.RentalItems)
 
 
 def _rank_instances_for_allocation(
     db: Session,
-    tool_id: int,
-    candidate_instance_ids: list[int],
-) -> list[int]:
-    if not candidate_instance_ids:
-        return []
+    candidates_by_tool: dict[int, list[int]],
+) -> dict[int, list[int]]:
+    candidate_ids = [iid for ids in candidates_by_tool.values() for iid in ids]
+    if not candidate_ids:
+        return {tool_id: [] for tool_id in candidates_by_tool}
+    # Sum rented days per instance in SQL Server (each rental counts at least one day), for every tool at once.
+    rental_days = func.datediff(literal_column("day"), Rental.StartDate, Rental.EndDate)
     rows = db.execute(
-        select(RentalItem.ToolInstanceID, Rental.StartDate, Rental.EndDate)
+        select(RentalItem.ToolID, RentalItem.ToolInstanceID, func.sum(case((rental_days < 1, 1), else_=rental_days)))
         .join(Rental, Rental.RentalID == RentalItem.RentalID)
-        .where(RentalItem.ToolID == tool_id)
-        .where(RentalItem.ToolInstanceID.in_(candidate_instance_ids))
+        .where(RentalItem.ToolID.in_(list(candidates_by_tool)))
+        .where(RentalItem.ToolInstanceID.in_(candidate_ids))
         .where(Rental.Status.notin_(["Offer"]))
+        .group_by(RentalItem.ToolID, RentalItem.ToolInstanceID)
     ).all()
-    days_by_instance: dict[int, int] = {iid: 0 for iid in candidate_instance_ids}
-    for iid, start_date, end_date in rows:
-        if iid is None:
-            continue
-        days_by_instance[iid] = days_by_instance.get(iid, 0) + max(1, (end_date - start_date).days)
-    return sorted(candidate_instance_ids, key=lambda iid: (-days_by_instance.get(iid, 0), iid))
+    days_by_instance = {(tool_id, iid): int(days or 0) for tool_id, iid, days in rows}
+    return {
+        tool_id: sorted(ids, key=lambda iid, tool_id=tool_id: (-days_by_instance.get((tool_id, iid), 0), iid))
+        for tool_id, ids in candidates_by_tool.items()
+    }
 
 
 def _apply_shortage_actions(rental: Rental, shortage_actions: list, operator_user_id: int | None) -> None:
@@ -2062,34 +2336,43 @@ def _allocate_reservation_lines(db: Session, rental: Rental, operator_user_id: i
     requested_by_tool: dict[int, int] = {}
     for line in request_lines:
         requested_by_tool[line.ToolID] = requested_by_tool.get(line.ToolID, 0) + int(line.Quantity or 0)
+    # First priced line per tool wins, matching the order the lines were created in.
+    daily_cost_by_tool: dict[int, float] = {}
+    for line in rental.RentalItems:
+        if line.DailyCost is not None and line.ToolID not in daily_cost_by_tool:
+            daily_cost_by_tool[line.ToolID] = float(line.DailyCost)
 
     reserved_count = 0
     shortage_count = 0
-    now_iso = datetime.now().isoformat()
+    reserved_ids: list[int] = []
+    now = datetime.now()
+    now_iso = now.isoformat()
 
+    available_by_tool = _get_available_instances_by_tool(
+        db,
+        [tool_id for tool_id, qty in requested_by_tool.items() if qty > 0],
+        rental.StartDate,
+        rental.EndDate,
+    )
+    ranked_by_tool = _rank_instances_for_allocation(
+        db,
+        {tool_id: [inst.ToolInstanceID for inst in instances] for tool_id, instances in available_by_tool.items()},
+    )
     for tool_id, qty in requested_by_tool.items():
         if qty <= 0:
             continue
-        available_instances = _get_available_instances(db, tool_id, rental.StartDate, rental.EndDate)
-        ranked_ids = _rank_instances_for_allocation(
-            db,
-            tool_id,
-            [inst.ToolInstanceID for inst in available_instances],
-        )
-        selected_ids = ranked_ids[:qty]
+        selected_ids = ranked_by_tool[tool_id][:qty]
+        reserved_ids.extend(selected_ids)
+        daily_cost = daily_cost_by_tool.get(tool_id, 0.0)
 
         for instance_id in selected_ids:
-            instance = db.get(ToolInstance, instance_id)
-            if instance:
-                instance.Status = "Reserved"
-                instance.UpdatedDate = datetime.now()
             db.add(
                 RentalItem(
                     RentalID=rental.RentalID,
                     ToolID=tool_id,
                     ToolInstanceID=instance_id,
                     Quantity=1,
-                    DailyCost=_resolve_tool_daily_cost(rental, tool_id),
+                    DailyCost=daily_cost,
                     CheckoutNotes="AUTO RESERVED ON APPROVAL",
                     ReturnNotes=_build_lifecycle_payload(
                         state="Reserved",
@@ -2109,7 +2392,7 @@ def _allocate_reservation_lines(db: Session, rental: Rental, operator_user_id: i
                     ToolID=tool_id,
                     ToolInstanceID=None,
                     Quantity=shortage_qty,
-                    DailyCost=_resolve_tool_daily_cost(rental, tool_id),
+                    DailyCost=daily_cost,
                     CheckoutNotes=f"DEFICIT: {shortage_qty} pending shortage handling",
                     ReturnNotes=_build_lifecycle_payload(
                         state="Pending Pickup",
@@ -2119,6 +2402,13 @@ def _allocate_reservation_lines(db: Session, rental: Rental, operator_user_id: i
                 )
             )
 
+    if reserved_ids:
+        db.execute(
+            update(ToolInstance)
+            .where(ToolInstance.ToolInstanceID.in_(reserved_ids))
+            .values(Status="Reserved", UpdatedDate=now)
+        )
+
     # Consume old request lines after allocation to avoid double counting.
     for line in request_lines:
         line.Quantity = 0
@@ -2132,28 +2422,36 @@ def _allocate_reservation_lines(db: Session, rental: Rental, operator_user_id: i
     return {"reservedCount": reserved_count, "shortageCount": shortage_count}
 
 
-def _resolve_tool_daily_cost(rental: Rental, tool_id: int) -> float:
-    for line in rental.RentalItems:
-        if line.ToolID == tool_id and line.DailyCost is not None:
-            return float(line.DailyCost)
-    return 0.0
-
-
 def _activate_rental(db: Session, rental: Rental, approved_by: int | None = None) -> None:
+    now = datetime.now()
+    now_iso = now.isoformat()
     _transition_state(rental, "Active")
     rental.ApprovedBy = approved_by
     rental.ApprovalDate = date.today()
     rental.ActualStart = rental.ActualStart or date.today()
-    rental.UpdatedDate = datetime.now()
+    rental.UpdatedDate = now
 
+    picked_ids: list[int] = []
     for item in rental.RentalItems:
         if not item.ToolInstanceID:
             continue
-        _mark_line_lifecycle(item, state="Picked Up", operator_user_id=approved_by, extra={"pickedAt": datetime.now().isoformat()})
-        instance = db.get(ToolInstance, item.ToolInstanceID)
-        if instance:
-            instance.Status = "In Rental"
-            instance.UpdatedDate = datetime.now()
+        _mark_line_lifecycle(item, state="Picked Up", operator_user_id=approved_by, extra={"pickedAt": now_iso})
+        picked_ids.append(item.ToolInstanceID)
+    if picked_ids:
+        db.execute(
+            update(ToolInstance)
+            .where(ToolInstance.ToolInstanceID.in_(picked_ids))
+            .values(Status="In Rental", UpdatedDate=now)
+        )
+
+
+def _is_image_signature(head: bytes) -> bool:
+    return (
+        head.startswith(b"\xff\xd8\xff")
+        or head.startswith(b"\x89PNG\r\n\x1a\n")
+        or head[:6] in {b"GIF87a", b"GIF89a"}
+        or (head[:4] == b"RIFF" and head[8:12] == b"WEBP")
+    )
 
 
 def _save_data_url_image(data_url: str, destination_dir: Path, prefix: str) -> str:
@@ -2166,6 +2464,8 @@ def _save_data_url_image(data_url: str, destination_dir: Path, prefix: str) -> s
         raise HTTPException(status_code=400, detail="Invalid data URL payload.")
 
     meta, b64_data = parts
+    if len(b64_data) * 3 // 4 > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail="Image is too large.")
     ext = "jpg"
     if "image/png" in meta:
         ext = "png"
@@ -2174,16 +2474,16 @@ def _save_data_url_image(data_url: str, destination_dir: Path, prefix: str) -> s
     elif "image/gif" in meta:
         ext = "gif"
 
+    filename = f"{prefix}_{uuid.uuid4().hex}.{ext}"
+    target = destination_dir / filename
+    # Decode in 4-aligned slices straight into the file instead of materializing the whole photo.
     try:
-        binary = base64.b64decode(b64_data, validate=True)
+        with _open_upload_target(target) as output:
+            for start in range(0, len(b64_data), UPLOAD_COPY_CHUNK_SIZE):
+                output.write(base64.b64decode(b64_data[start:start + UPLOAD_COPY_CHUNK_SIZE], validate=True))
     except (binascii.Error, ValueError) as exc:
+        target.unlink(missing_ok=True)
         raise HTTPException(status_code=400, detail="Invalid base64 image data.") from exc
-
-    destination_dir.mkdir(parents=True, exist_ok=True)
-    filename = f"{prefix}_{uuid.uuid4().hex}.{ext}"
-    target = destination_dir / filename
-    with target.open("wb") as output:
-        output.write(binary)
     return f"/uploads/rentals/{filename}"
 
 
@@ -2291,18 +2591,19 @@ def _serialize_rental_with_employee(rental: Rental, employee_directory: dict[str
 
 
 def _normalize_state(raw: str | None) -> str:
+    if raw in KNOWN_STATES:
+        return raw
     state = (raw or "Reserved").strip()
     return STATE_ALIASES.get(state, state)
 
 
-def _apply_runtime_state(rental: Rental) -> str:
+def _apply_runtime_state(rental: Rental, today: date | None = None) -> str:
     current = _normalize_state(rental.Status)
-    if current == "Active" and rental.EndDate and rental.EndDate < date.today():
+    if current == "Active" and rental.EndDate and rental.EndDate < (today or date.today()):
         rental.Status = "Overdue"
         rental.UpdatedDate = datetime.now()
         return "Overdue"
-    known_states = set(STATE_ALIASES.values()) | RESERVATION_STATES | TERMINAL_STATES
-    if current in known_states:
+    if current in KNOWN_STATES and current != rental.Status:
         rental.Status = current
     return rental.Status
 
@@ -2318,6 +2619,24 @@ def _transition_state(rental: Rental, target_state: str) -> None:
     rental.UpdatedDate = datetime.now()
 
 
+def _blocking_status_clause():
+    return or_(Rental.Status.is_(None), Rental.Status.in_(BLOCKING_RAW_STATES))
+
+
+def _overlapping_rental_items_stmt(column, start_date: date, end_date: date, exclude_rental_id: int | None = None):
+    # The one definition of a blocking overlap; callers add the instance filter and TOP 1/DISTINCT.
+    stmt = (
+        select(column)
+        .join(Rental, Rental.RentalID == RentalItem.RentalID)
+        .where(Rental.StartDate <= end_date)
+        .where(Rental.EndDate >= start_date)
+        .where(_blocking_status_clause())
+    )
+    if exclude_rental_id:
+        stmt = stmt.where(Rental.RentalID != exclude_rental_id)
+    return stmt
+
+
 def _has_instance_overlap(
     db: Session,
     tool_instance_id: int,
@@ -2325,21 +2644,48 @@ def _has_instance_overlap(
     end_date: date,
     exclude_rental_id: int | None = None,
 ) -> bool:
+    stmt = _overlapping_rental_items_stmt(RentalItem.RentalItemID, start_date, end_date, exclude_rental_id).where(
+        RentalItem.ToolInstanceID == tool_instance_id
+    )
+    # TOP 1 rather than SELECT EXISTS(...), which T-SQL does not accept.
+    return db.scalar(stmt.limit(1)) is not None
+
+
+def _find_overlapping_instance_ids(
+    db: Session,
+    tool_instance_ids: set[int],
+    start_date: date,
+    end_date: date,
+    exclude_rental_id: int | None = None,
+) -> set[int]:
+    if not tool_instance_ids:
+        return set()
     stmt = (
-        select(RentalItem.ToolInstanceID, Rental.Status)
-        .join(Rental, Rental.RentalID == RentalItem.RentalID)
-        .where(RentalItem.ToolInstanceID == tool_instance_id)
-        .where(Rental.StartDate <= end_date)
-        .where(Rental.EndDate >= start_date)
+        _overlapping_rental_items_stmt(RentalItem.ToolInstanceID, start_date, end_date, exclude_rental_id)
+        .where(RentalItem.ToolInstanceID.in_(tool_instance_ids))
+        .distinct()
     )
-    if exclude_rental_id:
-        stmt = stmt.where(Rental.RentalID != exclude_rental_id)
+    return set(db.scalars(stmt))
 
-    rows = db.execute(stmt).all()
-    for _, raw_status in rows:
-        if _normalize_state(raw_status) in BLOCKING_STATES:
-            return True
-    return False
+
+def _available_instances_stmt(start_date: date, end_date: date):
+    # Overlap, availability and calibration checks all run in SQL, so only eligible instances are loaded.
+    blocking_rental = _overlapping_rental_items_stmt(RentalItem.RentalItemID, start_date, end_date).where(
+        RentalItem.ToolInstanceID == ToolInstance.ToolInstanceID
+    )
+    return (
+        select(ToolInstance)
+        .where(ToolInstance.Status == "Available")
+        .where(
+            or_(
+                ToolInstance.RequiresCertification.is_(None),
+                ToolInstance.RequiresCertification == False,  # noqa: E712 - T-SQL has no IS FALSE
+                ToolInstance.NextCalibration >= end_date,
+            )
+        )
+        .where(~blocking_rental.exists())
+        .order_by(ToolInstance.SerialNumber)
+    )
 
 
 def _get_available_instances(
@@ -2349,39 +2695,25 @@ def _get_available_instances(
     end_date: date,
     exclude_instance_ids: list[int] | None = None,
 ) -> list[ToolInstance]:
-    exclude_ids = set(exclude_instance_ids or [])
+    stmt = _available_instances_stmt(start_date, end_date).where(ToolInstance.ToolID == tool_id)
+    if exclude_instance_ids:
+        stmt = stmt.where(ToolInstance.ToolInstanceID.not_in(exclude_instance_ids))
+    return list(db.execute(stmt).scalars().all())
 
-    overlap_stmt = (
-        select(RentalItem.ToolInstanceID, Rental.Status)
-        .join(Rental, Rental.RentalID == RentalItem.RentalID)
-        .where(RentalItem.ToolID == tool_id)
-        .where(RentalItem.ToolInstanceID.is_not(None))
-        .where(Rental.StartDate <= end_date)
-        .where(Rental.EndDate >= start_date)
-    )
-    busy_ids: set[int] = set()
-    for row in db.execute(overlap_stmt).all():
-        instance_id, raw_status = row
-        if instance_id is None:
-            continue
-        if _normalize_state(raw_status) in BLOCKING_STATES:
-            busy_ids.add(instance_id)
 
-    instances = db.execute(
-        select(ToolInstance)
-        .where(ToolInstance.ToolID == tool_id)
-        .where(ToolInstance.Status == "Available")
-        .order_by(ToolInstance.SerialNumber)
-    ).scalars().all()
-
-    available: list[ToolInstance] = []
-    for instance in instances:
-        if instance.ToolInstanceID in busy_ids or instance.ToolInstanceID in exclude_ids:
-            continue
-        if instance.RequiresCertification:
-            if not instance.NextCalibration or instance.NextCalibration < end_date:
-                continue
-        available.append(instance)
+def _get_available_instances_by_tool(
+    db: Session,
+    tool_ids: list[int],
+    start_date: date,
+    end_date: date,
+) -> dict[int, list[ToolInstance]]:
+    # One query for every tool of a rental; each list keeps the SerialNumber order of the single-tool lookup.
+    available: dict[int, list[ToolInstance]] = {tool_id: [] for tool_id in tool_ids}
+    if not tool_ids:
+        return available
+    stmt = _available_instances_stmt(start_date, end_date).where(ToolInstance.ToolID.in_(tool_ids))
+    for instance in db.execute(stmt).scalars():
+        available[instance.ToolID].append(instance)
     return available
 
 
@@ -2391,8 +2723,11 @@ def _validate_manual_instance(
     tool_instance_id: int,
     start_date: date,
     end_date: date,
+    instance: ToolInstance | None = None,
+    overlapping_ids: set[int] | None = None,
 ) -> ToolInstance:
-    instance = db.get(ToolInstance, tool_instance_id)
+    if instance is None:
+        instance = db.get(ToolInstance, tool_instance_id)
     if not instance or instance.ToolID != tool_id:
         raise HTTPException(status_code=400, detail="Invalid tool instance selected.")
     if instance.Status != "Available":
@@ -2400,21 +2735,27 @@ def _validate_manual_instance(
     if instance.RequiresCertification:
         if not instance.NextCalibration or instance.NextCalibration < end_date:
             raise HTTPException(status_code=400, detail="Selected tool instance expires before rental end.")
-    if _has_instance_overlap(db, tool_instance_id, start_date, end_date):
+    if overlapping_ids is not None:
+        overlaps = tool_instance_id in overlapping_ids
+    else:
+        overlaps = _has_instance_overlap(db, tool_instance_id, start_date, end_date)
+    if overlaps:
         raise HTTPException(status_code=400, detail="Selected tool instance overlaps existing reservation.")
     return instance
 
 
 def _release_reserved_instances(db: Session, rental: Rental) -> None:
-    for item in rental.RentalItems:
-        if not item.ToolInstanceID:
-            continue
-        instance = db.get(ToolInstance, item.ToolInstanceID)
-        if not instance:
-            continue
-        if instance.Status in {"Reserved", "Rented"}:
-            instance.Status = "Available"
-            instance.UpdatedDate = datetime.now()
+    instance_ids = [item.ToolInstanceID for item in rental.RentalItems if item.ToolInstanceID]
+    if not instance_ids:
+        return
+    # The default "auto" synchronization also refreshes any instances already loaded with the rental;
+    # UpdatedDate takes the server clock, like the column's server default.
+    db.execute(
+        update(ToolInstance)
+        .where(ToolInstance.ToolInstanceID.in_(instance_ids))
+        .where(ToolInstance.Status.in_(("Reserved", "Rented")))
+        .values(Status="Available", UpdatedDate=func.now())
+    )
 
 
 app.mount("/", StaticFiles(directory=str(STATIC_DIR), html=True), name="static")
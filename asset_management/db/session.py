@@ -1,6 +1,7 @@
 import os
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 
 
@@ -11,18 +12,48 @@ def _require_env(name: str) -> str:
     return value
 
 
+def _pool_options(url: str, pool_size: int | None = None, max_overflow: int | None = None) -> dict[str, int]:
+    # SQLite (tests/local tools) uses a singleton/static pool that rejects sizing arguments.
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    options = {"pool_timeout": DB_POOL_TIMEOUT_SECONDS, "pool_recycle": DB_POOL_RECYCLE_SECONDS}
+    if pool_size is not None:
+        options["pool_size"] = pool_size
+    if max_overflow is not None:
+        options["max_overflow"] = max_overflow
+    return options
+
+
+def _driver_options(url: str) -> dict[str, bool]:
+    # pyodbc sends executemany parameter sets as one array instead of a round-trip per row.
+    if make_url(url).get_driver_name() == "pyodbc":
+        return {"fast_executemany": True}
+    return {}
+
+
 ASSET_MANAGEMENT_DB_URL = _require_env("ASSET_MANAGEMENT_DB_URL")
 TIMEAPP_DB_URL = _require_env("TIMEAPP_DB_URL")
+# Every sync endpoint holds a connection on its worker thread; the default 5+10 pool starves a
+# 40-thread worker pool and requests stall for pool_timeout instead of running.
+ASSET_DB_POOL_SIZE = int(os.environ.get("ASSET_MANAGEMENT_DB_POOL_SIZE") or "20")
+ASSET_DB_MAX_OVERFLOW = int(os.environ.get("ASSET_MANAGEMENT_DB_MAX_OVERFLOW") or "20")
+# Fail a starved request after pool_timeout instead of hanging, and retire connections before
+# SQL Server / firewalls drop them as idle so pre_ping rarely has to reconnect mid-request.
+DB_POOL_TIMEOUT_SECONDS = int(os.environ.get("ASSET_MANAGEMENT_DB_POOL_TIMEOUT") or "30")
+DB_POOL_RECYCLE_SECONDS = int(os.environ.get("ASSET_MANAGEMENT_DB_POOL_RECYCLE") or "1800")
 
 engine_asset = create_engine(
     ASSET_MANAGEMENT_DB_URL,
     pool_pre_ping=True,
+    **_pool_options(ASSET_MANAGEMENT_DB_URL, ASSET_DB_POOL_SIZE, ASSET_DB_MAX_OVERFLOW),
+    **_driver_options(ASSET_MANAGEMENT_DB_URL),
     future=True,
 )
 
 engine_timeapp = create_engine(
     TIMEAPP_DB_URL,
     pool_pre_ping=True,
+    **_pool_options(TIMEAPP_DB_URL),
     future=True,
 )
 
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import json
+from base64 import b64decode, b64encode
+from typing import Any, Iterable
+
+import itsdangerous
+from itsdangerous.exc import BadSignature
+from starlette.exceptions import HTTPException
+from starlette.middleware.gzip import GZipMiddleware
+
+CORS_ALLOW_METHODS = ("DELETE", "GET", "HEAD", "OPTIONS", "PATCH", "POST", "PUT")
+PRECOMPRESSED_SUFFIXES = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".ico", ".woff", ".woff2", ".zip", ".gz", ".pdf")
+
+
+def _append_vary_origin(headers: list[tuple[bytes, bytes]]) -> None:
+    for index, (name, value) in enumerate(headers):
+        if name.lower() == b"vary":
+            headers[index] = (name, value + b", Origin")
+            return
+    headers.append((b"vary", b"Origin"))
+
+
+class PureCORSMiddleware:
+    def __init__(self, app, allow_origins: Iterable[str], allow_credentials: bool = False, max_age: int = 600) -> None:
+        origins = [str(origin) for origin in allow_origins]
+        self.app = app
+        self.allow_all_origins = "*" in origins
+        self.allow_credentials = bool(allow_credentials)
+        self._origins_bytes = {origin.encode("latin-1") for origin in origins if origin != "*"}
+        self._methods_bytes = {method.encode("ascii") for method in CORS_ALLOW_METHODS}
+
+        simple_headers: list[tuple[bytes, bytes]] = []
+        if self.allow_all_origins:
+            simple_headers.append((b"access-control-allow-origin", b"*"))
+        if self.allow_credentials:
+            simple_headers.append((b"access-control-allow-credentials", b"true"))
+        self._simple_headers = simple_headers
+
+        preflight_headers: list[tuple[bytes, bytes]] = []
+        self._preflight_explicit_origin = not self.allow_all_origins or self.allow_credentials
+        if self._preflight_explicit_origin:
+            preflight_headers.append((b"vary", b"Origin"))
+        else:
+            preflight_headers.append((b"access-control-allow-origin", b"*"))
+        preflight_headers.append((b"access-control-allow-methods", ", ".join(CORS_ALLOW_METHODS).encode("ascii")))
+        preflight_headers.append((b"access-control-max-age", str(int(max_age)).encode("ascii")))
+        if self.allow_credentials:
+            preflight_headers.append((b"access-control-allow-credentials", b"true"))
+        self._preflight_headers = preflight_headers
+
+    def _is_allowed_origin(self, origin: bytes) -> bool:
+        return self.allow_all_origins or origin in self._origins_bytes
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        request_method = None
+        request_headers = None
+        has_cookie = False
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                request_method = value
+            elif name == b"access-control-request-headers":
+                request_headers = value
+            elif name == b"cookie":
+                has_cookie = True
+
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            await self._preflight(origin, request_method, request_headers, send)
+            return
+
+        allowed = self._is_allowed_origin(origin)
+        explicit_origin = allowed and (not self.allow_all_origins or has_cookie)
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers") or [])
+                for name, value in self._simple_headers:
+                    if explicit_origin and name == b"access-control-allow-origin":
+                        continue
+                    headers.append((name, value))
+                if explicit_origin:
+                    headers.append((b"access-control-allow-origin", origin))
+                    _append_vary_origin(headers)
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _preflight(self, origin: bytes, request_method: bytes, request_headers: bytes | None, send) -> None:
+        headers = list(self._preflight_headers)
+        failures: list[str] = []
+
+        if self._is_allowed_origin(origin):
+            if self._preflight_explicit_origin:
+                headers.append((b"access-control-allow-origin", origin))
+        else:
+            failures.append("origin")
+
+        if request_method not in self._methods_bytes:
+            failures.append("method")
+
+        if request_headers is not None:
+            headers.append((b"access-control-allow-headers", request_headers))
+
+        if failures:
+            body = ("Disallowed CORS " + ", ".join(failures)).encode("utf-8")
+            status = 400
+        else:
+            body = b"OK"
+            status = 200
+        headers.append((b"content-type", b"text/plain; charset=utf-8"))
+        headers.append((b"content-length", str(len(body)).encode("ascii")))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+class BodySizeLimitMiddleware:
+    def __init__(self, app, limits: dict[str, int]) -> None:
+        self.app = app
+        self.limits = dict(limits)
+
+    async def __call__(self, scope, receive, send) -> None:
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > limit:
+                    await self._reject(send)
+                    return
+                break
+
+        received = 0
+
+        # Chunked or understated bodies are cut off as soon as they cross the limit.
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail="Request body too large.")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    async def _reject(self, send) -> None:
+        body = b'{"detail":"Request body too large."}'
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("ascii")),
+            (b"connection", b"close"),
+        ]
+        await send({"type": "http.response.start", "status": 413, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    # Images and other already-compressed files only burn CPU in gzip and can come out larger.
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 500,
+        compresslevel: int = 9,
+        skip_suffixes: Iterable[str] = PRECOMPRESSED_SUFFIXES,
+    ) -> None:
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.skip_suffixes = tuple(suffix.lower() for suffix in skip_suffixes)
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http" and scope["path"].lower().endswith(self.skip_suffixes):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+class PureSessionMiddleware:
+    def __init__(
+        self,
+        app,
+        secret_key: str,
+        session_cookie: str = "session",
+        max_age: int | None = 14 * 24 * 60 * 60,
+        path: str = "/",
+        same_site: str = "lax",
+        https_only: bool = False,
+    ) -> None:
+        self.app = app
+        self.signer = itsdangerous.TimestampSigner(str(secret_key))
+        self.max_age = max_age
+        self._cookie_prefix = f"{session_cookie}=".encode("latin-1")
+        security_flags = f"httponly; samesite={same_site}"
+        if https_only:
+            security_flags += "; secure"
+        max_age_flag = f"Max-Age={max_age}; " if max_age else ""
+        self._set_cookie_template = f"{session_cookie}={{data}}; path={path}; {max_age_flag}{security_flags}"
+        self._clear_cookie_header = (
+            f"{session_cookie}=null; path={path}; expires=Thu, 01 Jan 1970 00:00:00 GMT; {security_flags}"
+        ).encode("latin-1")
+
+    def _read_cookie(self, scope) -> bytes | None:
+        for name, value in scope["headers"]:
+            if name != b"cookie" or self._cookie_prefix not in value:
+                continue
+            for chunk in value.split(b";"):
+                chunk = chunk.strip()
+                if chunk.startswith(self._cookie_prefix):
+                    return chunk[len(self._cookie_prefix):]
+        return None
+
+    def _load(self, raw: bytes) -> dict[str, Any] | None:
+        try:
+            data = self.signer.unsign(raw, max_age=self.max_age)
+            payload = json.loads(b64decode(data))
+        except (BadSignature, ValueError):
+            return None
+        return payload if isinstance(payload, dict) else None
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        raw_cookie = self._read_cookie(scope)
+        initial = self._load(raw_cookie) if raw_cookie else None
+        scope["session"] = dict(initial or {})
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start":
+                session = scope["session"]
+                header_value = None
+                if session:
+                    # Re-signed on every response so Max-Age slides while the user stays active.
+                    data = self.signer.sign(b64encode(json.dumps(session).encode("utf-8")))
+                    header_value = self._set_cookie_template.format(data=data.decode("utf-8")).encode("latin-1")
+                elif initial:
+                    header_value = self._clear_cookie_header
+                if header_value is not None:
+                    headers = list(message.get("headers") or [])
+                    headers.append((b"set-cookie", header_value))
+                    message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
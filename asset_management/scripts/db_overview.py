@@ -10,7 +10,8 @@ from dataclasses import dataclass
 from typing import Iterable
 
 from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Engine
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.pool import NullPool
 
 
 EXPECTED_TABLES = [
@@ -65,6 +66,16 @@ EXPECTED_COLUMNS: dict[str, list[str]] = {
     ],
 }
 
+# Performance indexes from the dated scripts in "SQL Queries"; lookups degrade to scans without them.
+EXPECTED_INDEXES: dict[str, list[str]] = {
+    "ToolInstances": [
+        "IX_ToolInstances_ToolID_Status",
+        "IX_ToolInstances_WarehouseID_LocationCode",
+    ],
+    "RentalItems": ["IX_RentalItems_ToolInstanceID", "IX_RentalItems_RentalID"],
+    "Rental": ["IX_Rental_StartDate_EndDate", "IX_Rental_RentalNumber"],
+}
+
 
 @dataclass
 class CheckResult:
@@ -78,38 +89,40 @@ def _print_section(title: str) -> None:
 
 
 def _get_engine(db_url: str) -> Engine:
-    return create_engine(db_url, pool_pre_ping=True, future=True)
+    return create_engine(db_url, poolclass=NullPool, future=True)
 
 
-def _scalar(engine: Engine, sql: str, params: dict | None = None):
-    with engine.connect() as conn:
-        return conn.execute(text(sql), params or {}).scalar()
+def _scalar(conn: Connection, sql: str, params: dict | None = None):
+    return conn.execute(text(sql), params or {}).scalar()
 
 
-def _rows(engine: Engine, sql: str, params: dict | None = None):
-    with engine.connect() as conn:
-        return conn.execute(text(sql), params or {}).all()
+def _rows(conn: Connection, sql: str, params: dict | None = None):
+    return conn.execute(text(sql), params or {}).all()
 
 
-def _table_exists(engine: Engine, table_name: str) -> bool:
+def _load_dbo_columns(conn: Connection) -> dict[str, set[str]]:
+    # Table and column metadata for the whole schema in one round-trip; a table exists iff it has columns.
     sql = """
-        SELECT 1
-        FROM INFORMATION_SCHEMA.TABLES
-        WHERE TABLE_SCHEMA = 'dbo' AND TABLE_NAME = :table_name
+        SELECT TABLE_NAME, COLUMN_NAME
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = 'dbo'
     """
-    return bool(_scalar(engine, sql, {"table_name": table_name}))
+    columns: dict[str, set[str]] = {}
+    for table_name, column_name in _rows(conn, sql):
+        columns.setdefault(str(table_name), set()).add(str(column_name))
+    return columns
 
 
-def _column_names(engine: Engine, table_name: str) -> set[str]:
+def _load_dbo_index_names(conn: Connection) -> set[tuple[str, str]]:
     sql = """
-        SELECT COLUMN_NAME
-        FROM INFORMATION_SCHEMA.COLUMNS
-        WHERE TABLE_SCHEMA = 'dbo' AND TABLE_NAME = :table_name
+        SELECT OBJECT_NAME(object_id), name
+        FROM sys.indexes
+        WHERE OBJECT_SCHEMA_NAME(object_id) = 'dbo' AND name IS NOT NULL
     """
-    return {str(row[0]) for row in _rows(engine, sql, {"table_name": table_name})}
+    return {(str(table_name), str(index_name)) for table_name, index_name in _rows(conn, sql)}
 
 
-def _index_rows(engine: Engine, table_name: str):
+def _index_rows(conn: Connection, table_name: str):
     sql = """
         SELECT i.name,
                i.is_unique,
@@ -125,24 +138,29 @@ def _index_rows(engine: Engine, table_name: str):
         GROUP BY i.name, i.is_unique
         ORDER BY i.name
     """
-    return _rows(engine, sql, {"qualified_table": f"dbo.{table_name}"})
+    return _rows(conn, sql, {"qualified_table": f"dbo.{table_name}"})
 
 
-def _run_existence_checks(engine: Engine) -> list[CheckResult]:
+def _run_existence_checks(conn: Connection, columns: dict[str, set[str]]) -> list[CheckResult]:
     results: list[CheckResult] = []
     for table in EXPECTED_TABLES:
-        exists = _table_exists(engine, table)
+        exists = table in columns
         results.append(CheckResult(f"table:{table}", exists, "present" if exists else "missing"))
+    index_names = _load_dbo_index_names(conn)
+    for table, indexes in EXPECTED_INDEXES.items():
+        for index_name in indexes:
+            exists = (table, index_name) in index_names
+            results.append(CheckResult(f"index:{table}.{index_name}", exists, "present" if exists else "missing"))
     return results
 
 
-def _run_column_checks(engine: Engine) -> list[CheckResult]:
+def _run_column_checks(columns: dict[str, set[str]]) -> list[CheckResult]:
     results: list[CheckResult] = []
     for table, expected in EXPECTED_COLUMNS.items():
-        if not _table_exists(engine, table):
+        if table not in columns:
             results.append(CheckResult(f"columns:{table}", False, "table missing"))
             continue
-        actual = _column_names(engine, table)
+        actual = columns[table]
         missing = [name for name in expected if name not in actual]
         results.append(
             CheckResult(
@@ -154,12 +172,12 @@ def _run_column_checks(engine: Engine) -> list[CheckResult]:
     return results
 
 
-def _run_integrity_checks(engine: Engine) -> list[CheckResult]:
+def _run_integrity_checks(conn: Connection, columns: dict[str, set[str]]) -> list[CheckResult]:
     checks: list[CheckResult] = []
 
-    if _table_exists(engine, "ToolInstances"):
+    if "ToolInstances" in columns:
         duplicate_instance = _scalar(
-            engine,
+            conn,
             """
             SELECT COUNT(*)
             FROM (
@@ -179,7 +197,7 @@ def _run_integrity_checks(engine: Engine) -> list[CheckResult]:
         )
 
         null_instance = _scalar(
-            engine,
+            conn,
             "SELECT COUNT(*) FROM dbo.ToolInstances WHERE InstanceNumber IS NULL",
         )
         checks.append(
@@ -191,7 +209,7 @@ def _run_integrity_checks(engine: Engine) -> list[CheckResult]:
         )
 
         orphan_tool = _scalar(
-            engine,
+            conn,
             """
             SELECT COUNT(*)
             FROM dbo.ToolInstances ti
@@ -207,9 +225,9 @@ def _run_integrity_checks(engine: Engine) -> list[CheckResult]:
             )
         )
 
-    if _table_exists(engine, "RentalItems") and _table_exists(engine, "ToolInstances"):
+    if "RentalItems" in columns and "ToolInstances" in columns:
         orphan_instance_fk = _scalar(
-            engine,
+            conn,
             """
             SELECT COUNT(*)
             FROM dbo.RentalItems ri
@@ -235,34 +253,42 @@ def _print_results(title: str, rows: Iterable[CheckResult]) -> None:
         print(f"[{status}] {row.name} :: {row.detail}")
 
 
-def _print_row_counts(engine: Engine) -> None:
+def _print_row_counts(conn: Connection, columns: dict[str, set[str]]) -> None:
     _print_section("Row Counts")
+    # Heap/clustered partition metadata instead of a COUNT(*) scan per table; may lag in-flight transactions.
+    sql = """
+        SELECT o.name, SUM(p.rows)
+        FROM sys.partitions p
+        JOIN sys.objects o ON o.object_id = p.object_id
+        WHERE p.index_id IN (0, 1) AND o.schema_id = SCHEMA_ID('dbo') AND o.type = 'U'
+        GROUP BY o.name
+    """
+    counts = {str(name): int(rows or 0) for name, rows in _rows(conn, sql)}
     for table in EXPECTED_TABLES:
-        if not _table_exists(engine, table):
+        if table not in columns:
             print(f"{table}: missing")
             continue
-        count = _scalar(engine, f"SELECT COUNT(*) FROM dbo.{table}")
-        print(f"{table}: {int(count or 0)}")
+        print(f"{table}: {counts.get(table, 0)}")
 
 
-def _print_index_summary(engine: Engine) -> None:
+def _print_index_summary(conn: Connection, columns: dict[str, set[str]]) -> None:
     _print_section("Index Summary (key tables)")
-    for table in ["ToolInstances", "RentalItems", "AuditLogs", "AtlasUsers"]:
-        if not _table_exists(engine, table):
+    for table in ["ToolInstances", "RentalItems", "Rental", "AuditLogs", "AtlasUsers"]:
+        if table not in columns:
             print(f"{table}: missing")
             continue
         print(f"{table}:")
-        for name, is_unique, cols in _index_rows(engine, table):
+        for name, is_unique, cols in _index_rows(conn, table):
             print(f"  - {name} unique={bool(is_unique)} cols={cols}")
 
 
-def _print_samples(engine: Engine, sample_size: int) -> None:
+def _print_samples(conn: Connection, columns: dict[str, set[str]], sample_size: int) -> None:
     _print_section("Sample Values")
     sample_size = max(1, sample_size)
 
-    if _table_exists(engine, "ToolInstances"):
+    if "ToolInstances" in columns:
         rows = _rows(
-            engine,
+            conn,
             """
             SELECT TOP (:n) ToolInstanceID, ToolID, InstanceNumber, SerialNumber, Status
             FROM dbo.ToolInstances
@@ -274,9 +300,9 @@ def _print_samples(engine: Engine, sample_size: int) -> None:
         for row in rows:
             print(f"  - {tuple(row)}")
 
-    if _table_exists(engine, "AuditLogs"):
+    if "AuditLogs" in columns:
         rows = _rows(
-            engine,
+            conn,
             """
             SELECT TOP (:n) AuditID, EntityType, Action, UserID, CreatedAt
             FROM dbo.AuditLogs
@@ -302,18 +328,22 @@ def main() -> int:
 
     try:
         engine = _get_engine(db_url)
+        # One connection for the whole report; the checks below issue dozens of small queries.
+        conn = engine.connect()
         # Force a quick connectivity check first.
-        _scalar(engine, "SELECT 1")
+        _scalar(conn, "SELECT 1")
     except Exception as exc:
         print(f"Could not connect to DB: {exc}")
         return 3
 
-    _print_results("Table Existence", _run_existence_checks(engine))
-    _print_results("Column Checks", _run_column_checks(engine))
-    _print_results("Integrity Checks", _run_integrity_checks(engine))
-    _print_row_counts(engine)
-    _print_index_summary(engine)
-    _print_samples(engine, args.samples)
+    with conn:
+        columns = _load_dbo_columns(conn)
+        _print_results("Table Existence", _run_existence_checks(conn, columns))
+        _print_results("Column Checks", _run_column_checks(columns))
+        _print_results("Integrity Checks", _run_integrity_checks(conn, columns))
+        _print_row_counts(conn, columns)
+        _print_index_summary(conn, columns)
+        _print_samples(conn, columns, args.samples)
     return 0
 
 
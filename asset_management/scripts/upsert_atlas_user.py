@@ -9,8 +9,13 @@ import secrets
 import time
 
 from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
 
 
+# Must match services/atlas_user_service.py, which verifies the hashes this script writes.
+PASSWORD_HASH_ALGORITHM = "sha256"
+PASSWORD_HASH_ITERATIONS = 120000
+
 ADMIN_RIGHTS = {
     "manageUsers": True,
     "manageRentals": True,
@@ -27,13 +32,84 @@ USER_RIGHTS = {
     "checkout": True,
 }
 
+ADMIN_RIGHTS_JSON = json.dumps(ADMIN_RIGHTS, ensure_ascii=True)
+USER_RIGHTS_JSON = json.dumps(USER_RIGHTS, ensure_ascii=True)
+
+
+UPSERT_USER_SQL = text(
+    """
+    SET NOCOUNT ON;
+
+    -- UPDATE-then-INSERT instead of MERGE; UPDLOCK/SERIALIZABLE holds the key range so a concurrent
+    -- run cannot insert the same EmployeeID between the two statements.
+    UPDATE dbo.AtlasUsers WITH (UPDLOCK, SERIALIZABLE) SET
+        AssetManagementRole = :role,
+        AssetManagementRights = :asset_rights,
+        TimeAppRights = COALESCE(TimeAppRights, '{}'),
+        PeoplePlannerRights = COALESCE(PeoplePlannerRights, '{}'),
+        PasswordHash = CASE
+            WHEN :set_password = 1 THEN :password_hash
+            WHEN :reset_password = 1 THEN NULL
+            ELSE PasswordHash
+        END,
+        PasswordSalt = CASE
+            WHEN :set_password = 1 THEN :password_salt
+            WHEN :reset_password = 1 THEN NULL
+            ELSE PasswordSalt
+        END,
+        PasswordUpdatedAt = CASE
+            WHEN :set_password = 1 THEN :password_updated_at
+            WHEN :reset_password = 1 THEN NULL
+            ELSE PasswordUpdatedAt
+        END,
+        UpdatedAt = SYSUTCDATETIME()
+    WHERE EmployeeID = :employee_id;
+
+    IF @@ROWCOUNT = 0
+        INSERT INTO dbo.AtlasUsers (
+            EmployeeID,
+            AssetManagementRole,
+            AssetManagementRights,
+            TimeAppRights,
+            PeoplePlannerRights,
+            PasswordHash,
+            PasswordSalt,
+            PasswordUpdatedAt,
+            CreatedAt,
+            UpdatedAt
+        )
+        VALUES (
+            :employee_id,
+            :role,
+            :asset_rights,
+            '{}',
+            '{}',
+            CASE WHEN :set_password = 1 THEN :password_hash ELSE NULL END,
+            CASE WHEN :set_password = 1 THEN :password_salt ELSE NULL END,
+            CASE WHEN :set_password = 1 THEN :password_updated_at ELSE NULL END,
+            SYSUTCDATETIME(),
+            SYSUTCDATETIME()
+        );
+
+    SELECT
+        EmployeeID,
+        AssetManagementRole,
+        AssetManagementRights,
+        PasswordHash,
+        PasswordSalt,
+        UpdatedAt
+    FROM dbo.AtlasUsers
+    WHERE EmployeeID = :employee_id;
+    """
+)
+
 
 def _password_hash(password: str, salt: str) -> str:
     raw = hashlib.pbkdf2_hmac(
-        "sha256",
+        PASSWORD_HASH_ALGORITHM,
         password.encode("utf-8"),
         salt.encode("utf-8"),
-        120000,
+        PASSWORD_HASH_ITERATIONS,
     )
     return raw.hex()
 
@@ -75,8 +151,7 @@ def main() -> int:
     if args.password is not None and args.reset_password:
         parser.error("Use either --password or --reset-password, not both.")
 
-    rights = ADMIN_RIGHTS if args.role == "Admin" else USER_RIGHTS
-    rights_json = json.dumps(rights, ensure_ascii=True)
+    rights_json = ADMIN_RIGHTS_JSON if args.role == "Admin" else USER_RIGHTS_JSON
 
     if args.reset_password:
         password_hash = None
@@ -91,74 +166,10 @@ def main() -> int:
         password_salt = None
         password_updated_at = None
 
-    sql = text(
-        """
-        MERGE dbo.AtlasUsers AS target
-        USING (SELECT :employee_id AS EmployeeID) AS source
-        ON target.EmployeeID = source.EmployeeID
-        WHEN MATCHED THEN UPDATE SET
-            AssetManagementRole = :role,
-            AssetManagementRights = :asset_rights,
-            TimeAppRights = COALESCE(target.TimeAppRights, '{}'),
-            PeoplePlannerRights = COALESCE(target.PeoplePlannerRights, '{}'),
-            PasswordHash = CASE
-                WHEN :set_password = 1 THEN :password_hash
-                WHEN :reset_password = 1 THEN NULL
-                ELSE target.PasswordHash
-            END,
-            PasswordSalt = CASE
-                WHEN :set_password = 1 THEN :password_salt
-                WHEN :reset_password = 1 THEN NULL
-                ELSE target.PasswordSalt
-            END,
-            PasswordUpdatedAt = CASE
-                WHEN :set_password = 1 THEN :password_updated_at
-                WHEN :reset_password = 1 THEN NULL
-                ELSE target.PasswordUpdatedAt
-            END,
-            UpdatedAt = SYSUTCDATETIME()
-        WHEN NOT MATCHED THEN
-            INSERT (
-                EmployeeID,
-                AssetManagementRole,
-                AssetManagementRights,
-                TimeAppRights,
-                PeoplePlannerRights,
-                PasswordHash,
-                PasswordSalt,
-                PasswordUpdatedAt,
-                CreatedAt,
-                UpdatedAt
-            )
-            VALUES (
-                :employee_id,
-                :role,
-                :asset_rights,
-                '{}',
-                '{}',
-                CASE WHEN :set_password = 1 THEN :password_hash ELSE NULL END,
-                CASE WHEN :set_password = 1 THEN :password_salt ELSE NULL END,
-                CASE WHEN :set_password = 1 THEN :password_updated_at ELSE NULL END,
-                SYSUTCDATETIME(),
-                SYSUTCDATETIME()
-            );
-
-        SELECT
-            EmployeeID,
-            AssetManagementRole,
-            AssetManagementRights,
-            PasswordHash,
-            PasswordSalt,
-            UpdatedAt
-        FROM dbo.AtlasUsers
-        WHERE EmployeeID = :employee_id;
-        """
-    )
-
-    engine = create_engine(args.db_url, pool_pre_ping=True, future=True)
+    engine = create_engine(args.db_url, poolclass=NullPool, future=True)
     with engine.begin() as conn:
         row = conn.execute(
-            sql,
+            UPSERT_USER_SQL,
             {
                 "employee_id": args.employee_id,
                 "role": args.role,
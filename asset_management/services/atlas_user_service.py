@@ -1,16 +1,25 @@
 from __future__ import annotations
 
 import hashlib
+import hmac
 import json
 import secrets
 import time
+from functools import lru_cache
 from typing import Any
 
-from sqlalchemy import text
+import orjson
+from sqlalchemy import bindparam, text
 from sqlalchemy.orm import Session
 
 
+# Shared with scripts/upsert_atlas_user.py; changing either invalidates every stored PIN hash.
+PASSWORD_HASH_ALGORITHM = "sha256"
+PASSWORD_HASH_ITERATIONS = 120000
+
 DEFAULT_PASSWORD = "1234"
+# SQL Server caps a statement at 2100 parameters, so IN lookups are chunked well below that.
+ATLAS_USER_LOOKUP_CHUNK_SIZE = 1000
 DEFAULT_ROLE = "User"
 
 RIGHTS_BY_ROLE = {
@@ -50,10 +59,10 @@ def _normalize_rights(raw_rights: dict[str, Any] | None, role: str) -> dict[str,
 
 def _password_hash(password: str, salt: str) -> str:
     raw = hashlib.pbkdf2_hmac(
-        "sha256",
+        PASSWORD_HASH_ALGORITHM,
         (password or "").encode("utf-8"),
         salt.encode("utf-8"),
-        120000,
+        PASSWORD_HASH_ITERATIONS,
     )
     return raw.hex()
 
@@ -67,16 +76,23 @@ def _to_json(value: Any) -> str | None:
     return as_text or None
 
 
+@lru_cache(maxsize=512)
+def _parse_json_dict(raw: str) -> dict[str, Any]:
+    # Rights columns hold a handful of distinct JSON strings shared by many users, so parses are cached.
+    try:
+        parsed = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
 def _from_json_dict(value: Any) -> dict[str, Any]:
     if value in (None, ""):
         return {}
     if isinstance(value, dict):
         return value
-    try:
-        parsed = json.loads(str(value))
-    except (TypeError, ValueError, json.JSONDecodeError):
-        return {}
-    return parsed if isinstance(parsed, dict) else {}
+    # Copy so callers never mutate the cached dict.
+    return dict(_parse_json_dict(str(value)))
 
 
 def _fetch_atlas_user_row(db: Session, employee_id: int) -> dict[str, Any] | None:
@@ -103,13 +119,37 @@ def _fetch_atlas_user_row(db: Session, employee_id: int) -> dict[str, Any] | Non
     return dict(row) if row else None
 
 
-def get_user_record(db: Session, employee_id: int) -> dict[str, Any]:
-    row = _fetch_atlas_user_row(db, int(employee_id))
+def _fetch_atlas_user_rows(db: Session, employee_ids: list[int]) -> dict[int, dict[str, Any]]:
+    stmt = text(
+        """
+        SELECT
+            EmployeeID,
+            AssetManagementRole,
+            AssetManagementRights,
+            TimeAppRights,
+            PeoplePlannerRights,
+            PasswordHash
+        FROM dbo.AtlasUsers
+        WHERE EmployeeID IN :employee_ids
+        """
+    ).bindparams(bindparam("employee_ids", expanding=True))
+    rows_by_id: dict[int, dict[str, Any]] = {}
+    try:
+        for offset in range(0, len(employee_ids), ATLAS_USER_LOOKUP_CHUNK_SIZE):
+            chunk = employee_ids[offset:offset + ATLAS_USER_LOOKUP_CHUNK_SIZE]
+            for row in db.execute(stmt, {"employee_ids": chunk}).mappings():
+                rows_by_id[int(row["EmployeeID"])] = dict(row)
+    except Exception:
+        return {}
+    return rows_by_id
+
+
+def _build_record_from_row(employee_id: int, row: dict[str, Any] | None) -> dict[str, Any]:
     if not row:
         role = DEFAULT_ROLE
         rights = _normalize_rights(None, role)
         return {
-            "employeeID": int(employee_id),
+            "employeeID": employee_id,
             "role": role,
             "rights": rights,
             "assetManagementRights": rights,
@@ -122,7 +162,7 @@ def get_user_record(db: Session, employee_id: int) -> dict[str, Any]:
     role = _normalize_role(row.get("AssetManagementRole"))
     asset_rights = _normalize_rights(_from_json_dict(row.get("AssetManagementRights")), role)
     return {
-        "employeeID": int(employee_id),
+        "employeeID": employee_id,
         "role": role,
         "rights": asset_rights,
         "assetManagementRights": asset_rights,
@@ -133,8 +173,12 @@ def get_user_record(db: Session, employee_id: int) -> dict[str, Any]:
     }
 
 
+def get_user_record(db: Session, employee_id: int) -> dict[str, Any]:
+    return _build_record_from_row(int(employee_id), _fetch_atlas_user_row(db, int(employee_id)))
+
+
 def list_user_records(db: Session, employee_rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
-    users: list[dict[str, Any]] = []
+    employees: list[tuple[int, dict[str, Any]]] = []
     for row in employee_rows:
         try:
             employee_id = int(row.get("normalizedNumber") or row.get("employeeID") or 0)
@@ -142,7 +186,13 @@ def list_user_records(db: Session, employee_rows: list[dict[str, Any]]) -> list[
             continue
         if employee_id <= 0:
             continue
-        access = get_user_record(db, employee_id)
+        employees.append((employee_id, row))
+
+    # One IN lookup for the whole directory instead of a query per employee.
+    atlas_rows = _fetch_atlas_user_rows(db, sorted({employee_id for employee_id, _ in employees}))
+    users: list[dict[str, Any]] = []
+    for employee_id, row in employees:
+        access = _build_record_from_row(employee_id, atlas_rows.get(employee_id))
         users.append(
             {
                 "employeeID": employee_id,
@@ -189,8 +239,6 @@ def list_provisioned_users(db: Session) -> list[dict[str, Any]]:
         employee_id = int(row.get("EmployeeID") or 0)
         if employee_id <= 0:
             continue
-        role = _normalize_role(row.get("AssetManagementRole"))
-        rights = _normalize_rights(_from_json_dict(row.get("AssetManagementRights")), role)
         users.append(
             {
                 "employeeID": employee_id,
@@ -199,13 +247,7 @@ def list_provisioned_users(db: Session) -> list[dict[str, Any]]:
                 "initials": "",
                 "displayName": f"Employee #{employee_id}",
                 "departmentCode": "",
-                "role": role,
-                "rights": rights,
-                "assetManagementRights": rights,
-                "timeAppRights": _from_json_dict(row.get("TimeAppRights")),
-                "peoplePlannerRights": _from_json_dict(row.get("PeoplePlannerRights")),
-                "hasCustomPassword": bool(row.get("PasswordHash")),
-                "isProvisioned": True,
+                **_build_record_from_row(employee_id, row),
             }
         )
     return users
@@ -238,6 +280,16 @@ def create_user_record(
         password_hash = _password_hash(trimmed, password_salt)
         password_updated_at = int(time.time())
 
+    params = {
+        "employee_id": int(employee_id),
+        "role": next_role,
+        "asset_rights": _to_json(next_rights),
+        "timeapp_rights": _to_json(timeapp_rights or {}),
+        "peopleplanner_rights": _to_json(peopleplanner_rights or {}),
+        "password_hash": password_hash,
+        "password_salt": password_salt,
+        "password_updated_at": password_updated_at,
+    }
     try:
         db.execute(
             text(
@@ -267,22 +319,23 @@ def create_user_record(
                 )
                 """
             ),
-            {
-                "employee_id": int(employee_id),
-                "role": next_role,
-                "asset_rights": _to_json(next_rights),
-                "timeapp_rights": _to_json(timeapp_rights or {}),
-                "peopleplanner_rights": _to_json(peopleplanner_rights or {}),
-                "password_hash": password_hash,
-                "password_salt": password_salt,
-                "password_updated_at": password_updated_at,
-            },
+            params,
         )
     except Exception as exc:
         db.rollback()
         raise ValueError("AtlasUsers table unavailable. Run SQL migration 20260221_1605_atlas_users.sql.") from exc
     db.commit()
-    return get_user_record(db, int(employee_id))
+    # Reading the row back would check a connection out again after the commit; the values are known.
+    return _build_record_from_row(
+        int(employee_id),
+        {
+            "AssetManagementRole": params["role"],
+            "AssetManagementRights": params["asset_rights"],
+            "TimeAppRights": params["timeapp_rights"],
+            "PeoplePlannerRights": params["peopleplanner_rights"],
+            "PasswordHash": password_hash,
+        },
+    )
 
 
 def update_user_record(
@@ -311,39 +364,66 @@ def update_user_record(
         else _from_json_dict(current.get("PeoplePlannerRights") if current else None)
     )
 
-    password_hash = current.get("PasswordHash") if current else None
-    password_salt = current.get("PasswordSalt") if current else None
+    set_password = False
+    password_hash = None
+    password_salt = None
     password_updated_at = None
 
-    if reset_password:
-        password_hash = None
-        password_salt = None
-    elif password is not None:
+    if password is not None and not reset_password:
         trimmed = str(password).strip()
         if len(trimmed) < 4:
             raise ValueError("Password must be at least 4 characters.")
+        set_password = True
         password_salt = secrets.token_hex(16)
         password_hash = _password_hash(trimmed, password_salt)
         password_updated_at = int(time.time())
 
+    params = {
+        "employee_id": int(employee_id),
+        "role": next_role,
+        "asset_rights": _to_json(next_rights),
+        "timeapp_rights": _to_json(next_timeapp),
+        "peopleplanner_rights": _to_json(next_peopleplanner),
+        "set_password": 1 if set_password else 0,
+        "reset_password": 1 if reset_password else 0,
+        "password_hash": password_hash,
+        "password_salt": password_salt,
+        "password_updated_at": password_updated_at,
+    }
     try:
-        db.execute(
+        # Plain UPDATE for the usual existing-user case; the stored PIN is only touched when it changes.
+        # UPDLOCK/SERIALIZABLE holds the key range until commit, so a concurrent save for the same
+        # unprovisioned employee waits here instead of racing this one to the INSERT below.
+        result = db.execute(
             text(
                 """
-                MERGE dbo.AtlasUsers AS target
-                USING (SELECT :employee_id AS EmployeeID) AS source
-                ON target.EmployeeID = source.EmployeeID
-                WHEN MATCHED THEN UPDATE SET
+                UPDATE dbo.AtlasUsers WITH (UPDLOCK, SERIALIZABLE) SET
                     AssetManagementRole = :role,
                     AssetManagementRights = :asset_rights,
                     TimeAppRights = :timeapp_rights,
                     PeoplePlannerRights = :peopleplanner_rights,
-                    PasswordHash = :password_hash,
-                    PasswordSalt = :password_salt,
-                    PasswordUpdatedAt = COALESCE(:password_updated_at, target.PasswordUpdatedAt),
+                    PasswordHash = CASE
+                        WHEN :set_password = 1 THEN :password_hash
+                        WHEN :reset_password = 1 THEN NULL
+                        ELSE PasswordHash
+                    END,
+                    PasswordSalt = CASE
+                        WHEN :set_password = 1 THEN :password_salt
+                        WHEN :reset_password = 1 THEN NULL
+                        ELSE PasswordSalt
+                    END,
+                    PasswordUpdatedAt = COALESCE(:password_updated_at, PasswordUpdatedAt),
                     UpdatedAt = SYSUTCDATETIME()
-                WHEN NOT MATCHED THEN
-                    INSERT (
+                WHERE EmployeeID = :employee_id
+                """
+            ),
+            params,
+        )
+        if (result.rowcount or 0) == 0:
+            db.execute(
+                text(
+                    """
+                    INSERT INTO dbo.AtlasUsers (
                         EmployeeID,
                         AssetManagementRole,
                         AssetManagementRights,
@@ -354,8 +434,7 @@ def update_user_record(
                         PasswordUpdatedAt,
                         CreatedAt,
                         UpdatedAt
-                    )
-                    VALUES (
+                    ) VALUES (
                         :employee_id,
                         :role,
                         :asset_rights,
@@ -366,25 +445,33 @@ def update_user_record(
                         :password_updated_at,
                         SYSUTCDATETIME(),
                         SYSUTCDATETIME()
-                    );
-                """
-            ),
-            {
-                "employee_id": int(employee_id),
-                "role": next_role,
-                "asset_rights": _to_json(next_rights),
-                "timeapp_rights": _to_json(next_timeapp),
-                "peopleplanner_rights": _to_json(next_peopleplanner),
-                "password_hash": password_hash,
-                "password_salt": password_salt,
-                "password_updated_at": password_updated_at,
-            },
-        )
+                    )
+                    """
+                ),
+                params,
+            )
     except Exception as exc:
         db.rollback()
         raise ValueError("AtlasUsers table unavailable. Run SQL migration 20260221_1605_atlas_users.sql.") from exc
     db.commit()
-    return get_user_record(db, int(employee_id))
+
+    # Answer from the values just written instead of reading the row back.
+    if set_password:
+        stored_hash = password_hash
+    elif reset_password:
+        stored_hash = None
+    else:
+        stored_hash = current.get("PasswordHash") if current else None
+    return _build_record_from_row(
+        int(employee_id),
+        {
+            "AssetManagementRole": params["role"],
+            "AssetManagementRights": params["asset_rights"],
+            "TimeAppRights": params["timeapp_rights"],
+            "PeoplePlannerRights": params["peopleplanner_rights"],
+            "PasswordHash": stored_hash,
+        },
+    )
 
 
 def verify_password(db: Session, employee_id: int, pin_code: str) -> bool:
@@ -398,7 +485,7 @@ def verify_password(db: Session, employee_id: int, pin_code: str) -> bool:
     stored_salt = row.get("PasswordSalt")
     if not stored_hash or not stored_salt:
         return candidate == DEFAULT_PASSWORD
-    return _password_hash(candidate, str(stored_salt)) == str(stored_hash)
+    return hmac.compare_digest(_password_hash(candidate, str(stored_salt)), str(stored_hash))
 
 
 def delete_user_record(db: Session, employee_id: int) -> bool:
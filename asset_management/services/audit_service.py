@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable
+
+from sqlalchemy.orm import Session
+
+from models.asset_models import AuditLog
+
+AUDIT_BATCH_SIZE = 100
+AUDIT_FLUSH_INTERVAL_SECONDS = 0.1
+
+_LOGGER = logging.getLogger("asset_management.audit")
+_AUDIT_QUEUE: queue.SimpleQueue[dict[str, Any] | None] = queue.SimpleQueue()
+_WRITER_LOCK = threading.Lock()
+_WRITER_THREAD: threading.Thread | None = None
+
+
+def enqueue_audit(
+    entity_type: str,
+    entity_id: int,
+    action: str,
+    details: str | None = None,
+    user_id: int | None = None,
+) -> None:
+    # Best effort: rows are written after the business commit, so any still queued when the process dies are lost.
+    _AUDIT_QUEUE.put(
+        {
+            "EntityType": entity_type,
+            "EntityID": entity_id,
+            "Action": action,
+            "Details": details,
+            "UserID": user_id,
+            "CreatedAt": datetime.now(),
+        }
+    )
+
+
+def _write_batch(session_factory: Callable[[], Session], rows: list[dict[str, Any]]) -> None:
+    db: Session | None = None
+    try:
+        db = session_factory()
+        db.execute(AuditLog.__table__.insert(), rows)
+        db.commit()
+    except Exception:
+        _LOGGER.exception("Dropped %s audit rows", len(rows))
+        if db is not None:
+            db.rollback()
+    finally:
+        if db is not None:
+            db.close()
+
+
+def _drain(session_factory: Callable[[], Session]) -> None:
+    stopping = False
+    while not stopping:
+        first = _AUDIT_QUEUE.get()
+        if first is None:
+            break
+        # Give concurrent requests a moment to pile up so they share one INSERT/commit.
+        time.sleep(AUDIT_FLUSH_INTERVAL_SECONDS)
+        rows = [first]
+        while len(rows) < AUDIT_BATCH_SIZE:
+            try:
+                row = _AUDIT_QUEUE.get_nowait()
+            except queue.Empty:
+                break
+            if row is None:
+                stopping = True
+                break
+            rows.append(row)
+        try:
+            _write_batch(session_factory, rows)
+        except Exception:
+            # Never let one bad batch kill the writer; the queue would then grow unbounded.
+            _LOGGER.exception("Audit writer failed to clean up after %s rows", len(rows))
+
+
+def start_audit_writer(session_factory: Callable[[], Session]) -> None:
+    global _WRITER_THREAD
+    with _WRITER_LOCK:
+        if _WRITER_THREAD and _WRITER_THREAD.is_alive():
+            return
+        _WRITER_THREAD = threading.Thread(target=_drain, args=(session_factory,), name="audit-writer", daemon=True)
+        _WRITER_THREAD.start()
+
+
+def stop_audit_writer(timeout: float = 5.0) -> None:
+    global _WRITER_THREAD
+    with _WRITER_LOCK:
+        thread = _WRITER_THREAD
+        _WRITER_THREAD = None
+    if not thread:
+        return
+    _AUDIT_QUEUE.put(None)
+    thread.join(timeout)
@@ -1,21 +1,33 @@
 from __future__ import annotations
 
-import json
 import os
+import threading
 import time
 import urllib.error
 import urllib.request
 from typing import Any
 
+import orjson
+
 
 class EmployeeDirectoryError(RuntimeError):
     pass
 
 
+class _DirectoryNotModified(Exception):
+    pass
+
+
 _CACHE_TTL_SECONDS = 300
+_RETRY_AFTER_FAILURE_SECONDS = 30
 _EMPLOYEE_CACHE: dict[str, dict[str, str]] = {}
 _CACHE_EXPIRES_AT = 0.0
+_CACHE_GENERATION = 0
+_CACHE_ETAG = ""
+_CACHE_LAST_MODIFIED = ""
 _LAST_ERROR = ""
+_RETRY_AT = 0.0
+_REFRESH_LOCK = threading.Lock()
 
 
 def _require_env(name: str) -> str:
@@ -64,46 +76,76 @@ def _to_employee_entry(item: dict[str, Any]) -> dict[str, str] | None:
     }
 
 
-def _fetch_employee_rows() -> list[dict[str, Any]]:
+def _fetch_employee_rows(etag: str = "", last_modified: str = "") -> tuple[list[dict[str, Any]], str, str]:
     base_url = _require_env("EMPLOYEE_API_BASE_URL").rstrip("/")
     token = _require_env("EMPLOYEE_API_TOKEN")
     auth_header_name = (os.environ.get("EMPLOYEE_API_AUTH_HEADER") or "Authorization").strip()
     auth_scheme = (os.environ.get("EMPLOYEE_API_AUTH_SCHEME") or "").strip()
     auth_value = _build_auth_header_value(token, auth_scheme)
+    headers = {auth_header_name: auth_value}
+    # Conditional request: an unchanged directory comes back as 304 without a body to download or parse.
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
     request = urllib.request.Request(
         url=f"{base_url}/Employees/all",
-        headers={auth_header_name: auth_value},
+        headers=headers,
         method="GET",
     )
     try:
         with urllib.request.urlopen(request, timeout=20) as response:
+            if response.status == 304:
+                raise _DirectoryNotModified()
             if response.status != 200:
                 raise EmployeeDirectoryError(f"Employee API returned status {response.status}")
-            payload = json.loads(response.read().decode("utf-8"))
+            payload = orjson.loads(response.read())
             if not isinstance(payload, list):
                 raise EmployeeDirectoryError("Employee API payload is not a list")
-            return payload
+            return payload, response.headers.get("ETag") or "", response.headers.get("Last-Modified") or ""
     except urllib.error.HTTPError as exc:
+        if exc.code == 304:
+            raise _DirectoryNotModified() from exc
         raise EmployeeDirectoryError(f"Employee API HTTP error: {exc.code}") from exc
     except urllib.error.URLError as exc:
         raise EmployeeDirectoryError(f"Employee API connection error: {exc.reason}") from exc
-    except json.JSONDecodeError as exc:
+    except orjson.JSONDecodeError as exc:
         raise EmployeeDirectoryError("Employee API returned invalid JSON") from exc
 
 
-def get_employee_directory(force_refresh: bool = False) -> dict[str, dict[str, str]]:
-    global _CACHE_EXPIRES_AT, _LAST_ERROR
+def _serve_during_backoff() -> dict[str, dict[str, str]]:
+    if _EMPLOYEE_CACHE:
+        return _EMPLOYEE_CACHE
+    raise EmployeeDirectoryError(_LAST_ERROR or "Employee directory unavailable")
+
+
+def _refresh_employee_directory(force_refresh: bool) -> dict[str, dict[str, str]]:
+    global _EMPLOYEE_CACHE, _CACHE_EXPIRES_AT, _CACHE_GENERATION, _CACHE_ETAG, _CACHE_LAST_MODIFIED, _LAST_ERROR, _RETRY_AT
     now = time.time()
+    # Another caller may have refreshed, or failed to, while this one waited for the lock.
     if not force_refresh and _EMPLOYEE_CACHE and now < _CACHE_EXPIRES_AT:
-        return dict(_EMPLOYEE_CACHE)
+        return _EMPLOYEE_CACHE
+    if not force_refresh and now < _RETRY_AT:
+        return _serve_during_backoff()
 
     try:
-        rows = _fetch_employee_rows()
+        # Validators only make sense while there is a cache to fall back on.
+        if _EMPLOYEE_CACHE:
+            rows, etag, last_modified = _fetch_employee_rows(_CACHE_ETAG, _CACHE_LAST_MODIFIED)
+        else:
+            rows, etag, last_modified = _fetch_employee_rows()
+    except _DirectoryNotModified:
+        _CACHE_EXPIRES_AT = now + _CACHE_TTL_SECONDS
+        _LAST_ERROR = ""
+        _RETRY_AT = 0.0
+        return _EMPLOYEE_CACHE
     except EmployeeDirectoryError as exc:
         _LAST_ERROR = str(exc)
+        # Don't send every request back to a failing API; retry once the back-off has passed.
+        _RETRY_AT = now + _RETRY_AFTER_FAILURE_SECONDS
         # Keep serving stale cache if it exists.
         if _EMPLOYEE_CACHE:
-            return dict(_EMPLOYEE_CACHE)
+            return _EMPLOYEE_CACHE
         raise
 
     parsed: dict[str, dict[str, str]] = {}
@@ -115,11 +157,41 @@ def get_employee_directory(force_refresh: bool = False) -> dict[str, dict[str, s
             continue
         parsed[entry["normalizedNumber"]] = entry
 
-    _EMPLOYEE_CACHE.clear()
-    _EMPLOYEE_CACHE.update(parsed)
+    # Swap in the new dict rather than clearing and refilling, so readers never see it half-built.
+    _EMPLOYEE_CACHE = parsed
     _CACHE_EXPIRES_AT = now + _CACHE_TTL_SECONDS
+    _CACHE_GENERATION += 1
+    _CACHE_ETAG = etag
+    _CACHE_LAST_MODIFIED = last_modified
     _LAST_ERROR = ""
-    return dict(_EMPLOYEE_CACHE)
+    _RETRY_AT = 0.0
+    return _EMPLOYEE_CACHE
+
+
+def get_employee_directory(force_refresh: bool = False) -> dict[str, dict[str, str]]:
+    # The returned dict is shared and replaced wholesale on refresh; callers must treat it as read-only.
+    if not force_refresh:
+        now = time.time()
+        if _EMPLOYEE_CACHE and now < _CACHE_EXPIRES_AT:
+            return _EMPLOYEE_CACHE
+        if now < _RETRY_AT:
+            return _serve_during_backoff()
+
+    # One caller refreshes. While a stale cache exists the rest keep serving it instead of queueing on
+    # the API; only a cold start makes them wait for the first load.
+    if not _REFRESH_LOCK.acquire(blocking=not _EMPLOYEE_CACHE):
+        return _EMPLOYEE_CACHE
+    try:
+        return _refresh_employee_directory(force_refresh)
+    finally:
+        _REFRESH_LOCK.release()
+
+
+def invalidate_employee_directory() -> None:
+    # Expire rather than clear, so a failed refresh can still fall back to the stale cache.
+    global _CACHE_EXPIRES_AT, _RETRY_AT
+    _CACHE_EXPIRES_AT = 0.0
+    _RETRY_AT = 0.0
 
 
 def get_employees_list(force_refresh: bool = False) -> list[dict[str, str]]:
@@ -136,5 +208,6 @@ def get_directory_status() -> dict[str, str | int]:
     return {
         "cacheCount": cache_count,
         "cacheExpiresInSeconds": cache_expires_in,
+        "generation": _CACHE_GENERATION,
         "lastError": _LAST_ERROR,
     }
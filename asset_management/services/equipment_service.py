@@ -2,95 +2,70 @@ from __future__ import annotations
 
 import calendar
 from datetime import date
-from typing import Optional
+from typing import Any, Mapping
 
-from sqlalchemy import select
+from sqlalchemy import BigInteger, func, select, try_cast, union_all
 from sqlalchemy.orm import Session
 
 from models.asset_models import Tool, ToolInstance
 
 
-def _parse_seq(serial_number: str) -> Optional[int]:
-    parts = serial_number.split("-")
-    if len(parts) != 2:
-        return None
-    try:
-        return int(parts[1])
-    except ValueError:
-        return None
+def _registration_seq(serial_column, prefix: str):
+    # Everything after the prefix must be a plain number; "SP2026-0001-0002" style values cast to NULL.
+    return try_cast(func.substring(serial_column, len(prefix) + 1, 255), BigInteger).label("seq")
 
 
 def generate_next_registration_number(db: Session) -> str:
     year = date.today().year
     prefix = f"SP{year}-"
 
-    stmt_tools = select(Tool.SerialNumber).where(Tool.SerialNumber.startswith(prefix))
-    stmt_instances = select(ToolInstance.SerialNumber).where(ToolInstance.SerialNumber.startswith(prefix))
-    existing = db.execute(stmt_tools).scalars().all()
-    existing_instances = db.execute(stmt_instances).scalars().all()
+    # Let SQL Server compute the max sequence instead of pulling every serial of the year.
+    sequences = union_all(
+        select(_registration_seq(Tool.SerialNumber, prefix)).where(Tool.SerialNumber.startswith(prefix)),
+        select(_registration_seq(ToolInstance.SerialNumber, prefix)).where(ToolInstance.SerialNumber.startswith(prefix)),
+    ).subquery()
+    max_seq = db.execute(select(func.max(sequences.c.seq))).scalar()
 
-    max_seq = 0
-    for serial in existing + existing_instances:
-        if not serial:
-            continue
-        seq = _parse_seq(serial)
-        if seq and seq > max_seq:
-            max_seq = seq
-
-    next_seq = max_seq + 1
+    next_seq = max(int(max_seq or 0), 0) + 1
     return f"{prefix}{next_seq:04d}"
 
 
-def apply_certification_schedule(tool: Tool) -> None:
-    if not tool.RequiresCertification:
-        tool.CalibrationInterval = None
-        tool.LastCalibration = None
-        tool.NextCalibration = None
+def _apply_calibration_schedule(item: Tool | ToolInstance) -> None:
+    # Tools and instances carry the same calibration columns, so one schedule serves both.
+    if not item.RequiresCertification:
+        item.CalibrationInterval = None
+        item.LastCalibration = None
+        item.NextCalibration = None
         return
 
-    if not tool.LastCalibration:
-        tool.LastCalibration = date.today()
+    if not item.LastCalibration:
+        item.LastCalibration = date.today()
 
-    if tool.CalibrationInterval and tool.CalibrationInterval > 0:
-        months = tool.CalibrationInterval
-        year = tool.LastCalibration.year + (tool.LastCalibration.month - 1 + months) // 12
-        month = (tool.LastCalibration.month - 1 + months) % 12 + 1
-        last_day = calendar.monthrange(year, month)[1]
-        day = min(tool.LastCalibration.day, last_day)
-        tool.NextCalibration = date(year, month, day)
-    else:
-        tool.NextCalibration = None
+    months = item.CalibrationInterval
+    if not months or months <= 0:
+        item.NextCalibration = None
+        return
 
+    last = item.LastCalibration
+    year, month_index = divmod(last.month - 1 + months, 12)
+    year += last.year
+    month = month_index + 1
+    item.NextCalibration = date(year, month, min(last.day, calendar.monthrange(year, month)[1]))
 
-def apply_instance_certification_schedule(instance: ToolInstance) -> None:
-    if not instance.RequiresCertification:
-        instance.CalibrationInterval = None
-        instance.LastCalibration = None
-        instance.NextCalibration = None
-        return
 
-    if not instance.LastCalibration:
-        instance.LastCalibration = date.today()
+def apply_certification_schedule(tool: Tool) -> None:
+    _apply_calibration_schedule(tool)
+
 
-    if instance.CalibrationInterval and instance.CalibrationInterval > 0:
-        months = instance.CalibrationInterval
-        year = instance.LastCalibration.year + (instance.LastCalibration.month - 1 + months) // 12
-        month = (instance.LastCalibration.month - 1 + months) % 12 + 1
-        last_day = calendar.monthrange(year, month)[1]
-        day = min(instance.LastCalibration.day, last_day)
-        instance.NextCalibration = date(year, month, day)
-    else:
-        instance.NextCalibration = None
+def apply_instance_certification_schedule(instance: ToolInstance) -> None:
+    _apply_calibration_schedule(instance)
 
 
 def generate_next_instance_number(db: Session, tool_id: int) -> int:
-    stmt = select(ToolInstance.InstanceNumber).where(ToolInstance.ToolID == tool_id)
-    existing = db.execute(stmt).scalars().all()
-    max_seq = 0
-    for number in existing:
-        if number and number > max_seq:
-            max_seq = number
-    return max_seq + 1
+    max_seq = db.execute(
+        select(func.max(ToolInstance.InstanceNumber)).where(ToolInstance.ToolID == tool_id)
+    ).scalar()
+    return (max_seq or 0) + 1
 
 
 def build_instance_serial(tool_serial: str | None, instance_number: int) -> str:
@@ -98,31 +73,43 @@ def build_instance_serial(tool_serial: str | None, instance_number: int) -> str:
     return f"{base}-{instance_number:04d}"
 
 
+TOOL_PAYLOAD_FIELDS = (
+    ("toolID", "ToolID"),
+    ("toolName", "ToolName"),
+    ("serialNumber", "SerialNumber"),
+    ("modelNumber", "ModelNumber"),
+    ("manufacturer", "Manufacturer"),
+    ("categoryID", "CategoryID"),
+    ("description", "Description"),
+    ("purchaseDate", "PurchaseDate"),
+    ("purchaseCost", "PurchaseCost"),
+    ("currentValue", "CurrentValue"),
+    ("calibrationInterval", "CalibrationInterval"),
+    ("lastCalibration", "LastCalibration"),
+    ("nextCalibration", "NextCalibration"),
+    ("status", "Status"),
+    ("condition", "Condition"),
+    ("dailyRentalCost", "DailyRentalCost"),
+    ("requiresCertification", "RequiresCertification"),
+    ("warehouseID", "WarehouseID"),
+    ("locationCode", "LocationCode"),
+    ("imagePath", "ImagePath"),
+    ("createdDate", "CreatedDate"),
+    ("updatedDate", "UpdatedDate"),
+)
+
+
 def serialize_tool(tool: Tool, instance_count: int | None = None) -> dict:
-    payload = {
-        "toolID": tool.ToolID,
-        "toolName": tool.ToolName,
-        "serialNumber": tool.SerialNumber,
-        "modelNumber": tool.ModelNumber,
-        "manufacturer": tool.Manufacturer,
-        "categoryID": tool.CategoryID,
-        "description": tool.Description,
-        "purchaseDate": tool.PurchaseDate,
-        "purchaseCost": tool.PurchaseCost,
-        "currentValue": tool.CurrentValue,
-        "calibrationInterval": tool.CalibrationInterval,
-        "lastCalibration": tool.LastCalibration,
-        "nextCalibration": tool.NextCalibration,
-        "status": tool.Status,
-        "condition": tool.Condition,
-        "dailyRentalCost": tool.DailyRentalCost,
-        "requiresCertification": bool(tool.RequiresCertification),
-        "warehouseID": tool.WarehouseID,
-        "locationCode": tool.LocationCode,
-        "imagePath": tool.ImagePath,
-        "createdDate": tool.CreatedDate,
-        "updatedDate": tool.UpdatedDate,
-    }
+    payload = {key: getattr(tool, attr) for key, attr in TOOL_PAYLOAD_FIELDS}
+    payload["requiresCertification"] = bool(tool.RequiresCertification)
+    if instance_count is not None:
+        payload["instanceCount"] = instance_count
+    return payload
+
+
+def serialize_tool_row(row: Mapping[str, Any], instance_count: int | None = None) -> dict:
+    payload = {key: row[attr] for key, attr in TOOL_PAYLOAD_FIELDS}
+    payload["requiresCertification"] = bool(row["RequiresCertification"])
     if instance_count is not None:
         payload["instanceCount"] = instance_count
     return payload
@@ -1,9 +1,9 @@
 from __future__ import annotations
 
 from datetime import date, datetime
-import json
 
-from sqlalchemy import select
+import orjson
+from sqlalchemy import Integer, func, select, try_cast, update
 from sqlalchemy.orm import Session
 
 from models.asset_models import Rental, RentalItem, Tool, ToolInstance
@@ -11,18 +11,12 @@ from models.asset_models import Rental, RentalItem, Tool, ToolInstance
 
 def generate_rental_number(db: Session, prefix: str = "RNT") -> str:
     token = (prefix or "RNT").upper()
-    last = db.execute(
-        select(Rental)
+    # Suffixes that are not plain numbers cast to NULL, so MAX only sees well-formed numbers.
+    max_number = db.execute(
+        select(func.max(try_cast(func.substring(Rental.RentalNumber, len(token) + 2, 50), Integer)))
         .where(Rental.RentalNumber.like(f"{token}-%"))
-        .order_by(Rental.RentalID.desc())
-    ).scalars().first()
-    next_number = 1
-    if last and last.RentalNumber:
-        raw = last.RentalNumber.replace(f"{token}-", "")
-        try:
-            next_number = int(raw) + 1
-        except ValueError:
-            next_number = 1
+    ).scalar()
+    next_number = max(int(max_number or 0), 0) + 1
     return f"{token}-{next_number:03d}"
 
 
@@ -30,22 +24,13 @@ def generate_offer_number(db: Session, created_on: date | None = None) -> str:
     current_date = created_on or date.today()
     yy = f"{current_date.year % 100:02d}"
 
-    rows = db.execute(
-        select(Rental.RentalNumber).where(Rental.RentalNumber.like(f"{yy}%"))
-    ).all()
-
-    max_suffix = 0
-    for row in rows:
-        number = (row[0] or "").strip()
-        if len(number) != 6 or not number.isdigit():
-            continue
-        if not number.startswith(yy):
-            continue
-        suffix = int(number[2:])
-        if suffix > max_suffix:
-            max_suffix = suffix
-
-    next_suffix = max_suffix + 1
+    # Offer numbers are exactly yy + four digits; the T-SQL character classes keep other numbers out.
+    max_suffix = db.execute(
+        select(func.max(try_cast(func.substring(Rental.RentalNumber, 3, 4), Integer)))
+        .where(Rental.RentalNumber.like(f"{yy}[0-9][0-9][0-9][0-9]"))
+    ).scalar()
+
+    next_suffix = int(max_suffix or 0) + 1
     return f"{yy}{next_suffix:04d}"
 
 
@@ -58,12 +43,13 @@ def recalc_total_cost(rental: Rental) -> None:
     if rental_days < 1:
         rental_days = 1
 
+    # Quantity is an Integer column already; only the Numeric DailyCost needs converting. Unchanged
+    # totals are not reassigned, which skips the attribute event and history work on untouched lines.
     total = 0
     for item in rental.RentalItems:
-        daily = float(item.DailyCost or 0)
-        quantity = int(item.Quantity or 0)
-        line_total = daily * rental_days * quantity
-        item.TotalCost = line_total
+        line_total = float(item.DailyCost or 0) * rental_days * (item.Quantity or 0)
+        if item.TotalCost is None or item.TotalCost != line_total:
+            item.TotalCost = line_total
         total += line_total
     rental.TotalCost = total
 
@@ -145,30 +131,30 @@ def _parse_lifecycle(raw: str | None) -> dict:
     if not value.startswith("{"):
         return {}
     try:
-        parsed = json.loads(value)
+        parsed = orjson.loads(value)
         return parsed if isinstance(parsed, dict) else {}
-    except (ValueError, json.JSONDecodeError):
+    except orjson.JSONDecodeError:
         return {}
 
 
 def apply_return_updates(db: Session, rental: Rental, return_condition: str, return_notes: str | None) -> None:
+    now = datetime.now()
     rental.Status = "Returned"
     rental.ActualEnd = date.today()
     rental.ReturnCondition = return_condition
-    rental.UpdatedDate = datetime.now()
+    rental.UpdatedDate = now
 
     if return_notes:
         rental.Notes = (rental.Notes + "\n" if rental.Notes else "") + return_notes
 
-    for item in rental.RentalItems:
-        if item.ToolInstanceID:
-            instance = db.get(ToolInstance, item.ToolInstanceID)
-            if instance:
-                instance.Status = "Available"
-                instance.UpdatedDate = datetime.now()
-            continue
-
-        tool = db.get(Tool, item.ToolID)
-        if tool:
-            tool.Status = "Available"
-            tool.UpdatedDate = datetime.now()
+    # Free tracked instances, and the tool itself for lines without one, with one UPDATE each.
+    instance_ids = {item.ToolInstanceID for item in rental.RentalItems if item.ToolInstanceID}
+    tool_ids = {item.ToolID for item in rental.RentalItems if not item.ToolInstanceID and item.ToolID}
+    if instance_ids:
+        db.execute(
+            update(ToolInstance)
+            .where(ToolInstance.ToolInstanceID.in_(instance_ids))
+            .values(Status="Available", UpdatedDate=now)
+        )
+    if tool_ids:
+        db.execute(update(Tool).where(Tool.ToolID.in_(tool_ids)).values(Status="Available", UpdatedDate=now))
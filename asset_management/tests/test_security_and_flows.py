@@ -1,8 +1,12 @@
+import base64
+import json
 import os
 import sys
+import tempfile
 import unittest
 from pathlib import Path
 from types import SimpleNamespace
+from unittest import mock
 
 from fastapi.testclient import TestClient
 
@@ -17,6 +21,7 @@ if str(APP_DIR) not in sys.path:
     sys.path.insert(0, str(APP_DIR))
 
 import AssetMan as app_module
+from services import user_access_service
 
 
 class FakeDb:
@@ -25,6 +30,8 @@ class FakeDb:
         self.commits = 0
         self.rollbacks = 0
         self.added = []
+        self.executed = []
+        self.tool_rows = []
 
     def add(self, value):
         self.added.append(value)
@@ -35,8 +42,20 @@ class FakeDb:
     def rollback(self):
         self.rollbacks += 1
 
+    def delete(self, value):
+        self.tool_rows = [row for row in self.tool_rows if row["ToolID"] != value.ToolID]
+
     def execute(self, *args, **kwargs):
+        self.executed.append(args[0] if args else None)
+        matched = 1 if self.instance else 0
+        rows = list(self.tool_rows)
+
         class _Result:
+            rowcount = matched
+
+            def mappings(self_inner):
+                return rows
+
             def all(self_inner):
                 return []
 
@@ -52,11 +71,20 @@ class FakeDb:
         model_name = getattr(model, "__name__", "")
         if model_name == "ToolInstance" and self.instance and int(identifier) == int(self.instance.ToolInstanceID):
             return self.instance
+        if model_name == "Tool":
+            for row in self.tool_rows:
+                if row["ToolID"] == int(identifier):
+                    return SimpleNamespace(**row)
         return None
 
 
 class SecurityAndFlowTests(unittest.TestCase):
     def setUp(self):
+        # Keep login/logout from writing revoked tokens into the source tree's data directory.
+        data_dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(mock.patch.object(user_access_service, "_DATA_DIR", data_dir))
+        self.enterContext(mock.patch.object(user_access_service, "_STORE_PATH", data_dir / "user_access.json"))
+        self.enterContext(mock.patch.object(user_access_service, "_REVOKED_TOKENS_PATH", data_dir / "revoked_sessions.json"))
         self.fake_db = FakeDb()
         app_module.app.dependency_overrides[app_module.get_asset_db] = lambda: self.fake_db
         self.client = TestClient(app_module.app)
@@ -95,6 +123,14 @@ class SecurityAndFlowTests(unittest.TestCase):
         set_cookie = login.headers.get("set-cookie", "")
         self.assertIn("asset_management_session=", set_cookie)
 
+    def test_login_rejects_unknown_fields_with_400(self):
+        response = self.client.post(
+            "/api/auth/login",
+            json={"username": "admin", "password": "admin-test-pin", "isAdmin": True},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"detail": "Invalid login request."})
+
     def test_kiosk_lend_requires_valid_pin(self):
         original_directory = app_module.get_employee_directory
         original_verify = app_module.verify_password
@@ -161,8 +197,10 @@ class SecurityAndFlowTests(unittest.TestCase):
             json={"toolID": 77, "warehouseID": 2, "locationCode": "B-4"},
         )
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(self.fake_db.instance.WarehouseID, 2)
-        self.assertEqual(self.fake_db.instance.LocationCode, "B-4")
+        params = self.fake_db.executed[0].compile().params
+        self.assertEqual(params["WarehouseID"], 2)
+        self.assertEqual(params["LocationCode"], "B-4")
+        self.assertEqual(params["ToolInstanceID_1"], 77)
 
     def test_auth_users_returns_provisioned_atlas_users_only(self):
         original_list_provisioned_users = app_module.list_provisioned_users
@@ -205,6 +243,178 @@ class SecurityAndFlowTests(unittest.TestCase):
             app_module.verify_password = original_verify_password
             app_module.get_employee_directory = original_get_employee_directory
 
+    def _login_admin(self):
+        login = self.client.post(
+            "/api/auth/login",
+            json={"username": "admin", "password": "admin-test-pin"},
+        )
+        self.assertEqual(login.status_code, 200)
+        return login
+
+    def test_session_cookie_round_trips_and_slides_on_every_response(self):
+        login = self._login_admin()
+        set_cookie = login.headers.get("set-cookie", "")
+        self.assertIn("asset_management_session=", set_cookie)
+        self.assertIn("Max-Age=1209600", set_cookie)
+        self.assertIn("httponly", set_cookie)
+        self.assertIn("samesite=lax", set_cookie)
+
+        me = self.client.get("/api/auth/me")
+        self.assertEqual(me.status_code, 200)
+        self.assertEqual((me.json().get("user") or {}).get("role"), "Admin")
+        refreshed = me.headers.get("set-cookie", "")
+        self.assertIn("asset_management_session=", refreshed)
+        self.assertIn("Max-Age=1209600", refreshed)
+
+        anonymous = TestClient(app_module.app).get("/api/auth/me")
+        self.assertNotIn("set-cookie", anonymous.headers)
+
+        logout = self.client.post("/api/auth/logout")
+        self.assertEqual(logout.status_code, 200)
+        self.assertIn("asset_management_session=null", logout.headers.get("set-cookie", ""))
+        self.assertIn("expires=Thu, 01 Jan 1970", logout.headers.get("set-cookie", ""))
+
+    def test_session_cookie_with_tampered_payload_is_rejected(self):
+        self._login_admin()
+        cookie = self.client.cookies.get("asset_management_session")
+        payload, timestamp, signature = cookie.rsplit(".", 2)
+        forged = base64.b64encode(
+            json.dumps({"user": {"employeeID": 1, "role": "Admin", "rights": {"manageUsers": True}}}).encode("utf-8")
+        ).decode("ascii")
+        self.assertNotEqual(forged, payload)
+
+        for tampered in (f"{forged}.{timestamp}.{signature}", f"{payload}.{timestamp}.{signature[:-2]}xx"):
+            self.client.cookies.clear()
+            self.client.cookies.set("asset_management_session", tampered)
+            me = self.client.get("/api/auth/me")
+            self.assertEqual(me.status_code, 401)
+            self.assertNotIn("set-cookie", me.headers)
+
+    def test_cors_preflight_echoes_allowed_origin(self):
+        response = self.client.options(
+            "/api/auth/me",
+            headers={
+                "Origin": "http://localhost:5001",
+                "Access-Control-Request-Method": "GET",
+                "Access-Control-Request-Headers": "x-session-token",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers.get("access-control-allow-origin"), "http://localhost:5001")
+        self.assertEqual(response.headers.get("access-control-allow-credentials"), "true")
+        self.assertEqual(response.headers.get("access-control-allow-headers"), "x-session-token")
+        self.assertIn("GET", response.headers.get("access-control-allow-methods", ""))
+        self.assertEqual(response.headers.get("vary"), "Origin")
+
+    def test_cors_preflight_rejects_disallowed_origin_and_method(self):
+        response = self.client.options(
+            "/api/auth/me",
+            headers={"Origin": "http://evil.example", "Access-Control-Request-Method": "GET"},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.text, "Disallowed CORS origin")
+        self.assertNotIn("access-control-allow-origin", response.headers)
+
+        response = self.client.options(
+            "/api/auth/me",
+            headers={"Origin": "http://localhost:5001", "Access-Control-Request-Method": "TRACE"},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.text, "Disallowed CORS method")
+
+    def test_cors_simple_request_only_echoes_allowed_origin(self):
+        allowed = self.client.get("/api/auth/me", headers={"Origin": "http://localhost:5001"})
+        self.assertEqual(allowed.headers.get("access-control-allow-origin"), "http://localhost:5001")
+        self.assertIn("Origin", allowed.headers.get("vary", ""))
+
+        disallowed = self.client.get("/api/auth/me", headers={"Origin": "http://evil.example"})
+        self.assertNotIn("access-control-allow-origin", disallowed.headers)
+
+    def test_oversized_content_length_is_rejected_with_413(self):
+        body = b"x" * (app_module._UPLOAD_BODY_LIMIT + 1)
+        response = self.client.post(
+            "/api/equipment/upload-image",
+            content=body,
+            headers={"Content-Type": "multipart/form-data; boundary=test"},
+        )
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json(), {"detail": "Request body too large."})
+        # Rejected from the header alone, before any of the body is read.
+        self.assertEqual(response.headers.get("connection"), "close")
+
+    def test_chunked_body_crossing_the_limit_is_rejected_with_413(self):
+        chunk = b" " * app_module.UPLOAD_COPY_CHUNK_SIZE
+        chunks = app_module._KIOSK_BODY_LIMIT // len(chunk) + 2
+
+        def stream():
+            yield b"{"
+            for _ in range(chunks):
+                yield chunk
+            yield b"}"
+
+        response = self.client.post(
+            "/api/kiosk/lend",
+            content=stream(),
+            headers={"Content-Type": "application/json"},
+        )
+        self.assertEqual(response.request.headers.get("transfer-encoding"), "chunked")
+        self.assertNotIn("content-length", response.request.headers)
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json(), {"detail": "Request body too large."})
+
+    def test_image_upload_is_accepted_by_signature(self):
+        with tempfile.TemporaryDirectory() as upload_dir, mock.patch.object(app_module, "UPLOADS_DIR", Path(upload_dir)):
+            response = self.client.post(
+                "/api/equipment/upload-image",
+                files={"file": ("drill.png", b"\x89PNG\r\n\x1a\n" + b"\0" * 100, "image/png")},
+            )
+            self.assertEqual(response.status_code, 200)
+            saved = Path(upload_dir) / Path(response.json()["path"]).name
+            self.assertEqual(saved.stat().st_size, 108)
+
+    def test_image_upload_rejects_body_that_is_not_an_image(self):
+        with tempfile.TemporaryDirectory() as upload_dir, mock.patch.object(app_module, "UPLOADS_DIR", Path(upload_dir)):
+            response = self.client.post(
+                "/api/equipment/upload-image",
+                files={"file": ("drill.png", b"<?php echo 'not an image'; ?>", "image/png")},
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(list(Path(upload_dir).iterdir()), [])
+
+    def _tool_row(self, tool_id, name):
+        row = {column.name: None for column in app_module.Tool.__table__.c}
+        row.update(ToolID=tool_id, ToolName=name, InstanceCount=1, InstanceNextCalibrationMin=None)
+        return row
+
+    def test_equipment_list_cache_is_invalidated_by_writes_and_the_shared_stamp(self):
+        stamp_path = Path(self.enterContext(tempfile.TemporaryDirectory())) / "equipment_cache.stamp"
+        self.enterContext(mock.patch.object(app_module, "_EQUIPMENT_CACHE_STAMP_PATH", stamp_path))
+        self.enterContext(mock.patch.object(app_module, "EQUIPMENT_CACHE_TTL_SECONDS", 60))
+        app_module._EQUIPMENT_CACHE.clear()
+        self.addCleanup(app_module._EQUIPMENT_CACHE.clear)
+        self.fake_db.tool_rows = [self._tool_row(1, "Drill"), self._tool_row(2, "Saw")]
+
+        first = self.client.get("/api/equipment")
+        self.assertEqual([tool["toolName"] for tool in first.json()], ["Drill", "Saw"])
+        cached = self.client.get("/api/equipment")
+        self.assertEqual(cached.json(), first.json())
+        self.assertEqual(len(self.fake_db.executed), 1)
+
+        deleted = self.client.delete("/api/equipment/1")
+        self.assertEqual(deleted.status_code, 200)
+        self.assertTrue(stamp_path.exists())
+        after_delete = self.client.get("/api/equipment")
+        self.assertEqual([tool["toolName"] for tool in after_delete.json()], ["Saw"])
+        self.assertEqual(len(self.fake_db.executed), 2)
+
+        # Another worker's write only reaches this process through the stamp's mtime.
+        self.fake_db.tool_rows.append(self._tool_row(3, "Level"))
+        self.assertEqual(len(self.client.get("/api/equipment").json()), 1)
+        stamp_ns = stamp_path.stat().st_mtime_ns + 1_000_000
+        os.utime(stamp_path, ns=(stamp_ns, stamp_ns))
+        after_stamp = self.client.get("/api/equipment")
+        self.assertEqual([tool["toolName"] for tool in after_stamp.json()], ["Saw", "Level"])
+
 
 if __name__ == "__main__":
     unittest.main()